@@ -0,0 +1,68 @@
+import multiprocessing
+import tempfile
+import pathlib
+import time
+import pandas as pd
+
+from src.data.helper_closed_transactions import read_epex_file, filter_lead_time, extract_transactions
+from src.data.synthetic_epex import generate_epex_day, write_epex_day
+from src.data.profiling import peak_rss_mb, reset_peak_rss
+
+
+def measure_engine(path_filtered, engine, queue):
+
+    # runs in a fresh process so that the peak RSS only accounts for the transaction derivation
+    df_filtered, unbounded_contract = pd.read_pickle(path_filtered)
+    reset_peak_rss()
+    rss_before = peak_rss_mb()
+
+    tic = time.time()
+    pivoted, pivoted_levels = extract_transactions(
+        df_filtered, unbounded_contract=unbounded_contract, engine=engine)
+    toc = time.time()
+
+    rss_after = peak_rss_mb()
+
+    queue.put({'engine': engine,
+               'seconds': toc-tic,
+               'peak_rss_mb': rss_after,
+               'peak_rss_increase_mb': rss_after-rss_before,
+               'transactions': pivoted_levels.shape[0]})
+
+
+def benchmark_extract_transactions(n_rows=2000000, executed_share=0.5, day='2019-04-03'):
+
+    with tempfile.TemporaryDirectory() as folder_root_path:
+
+        # derive the filtered LOB of one synthetic EPEX day
+        path = write_epex_day(generate_epex_day(
+            day, n_rows=n_rows, executed_share=executed_share), folder_root_path, day)
+        df_filtered, unbounded_contract = filter_lead_time(
+            read_epex_file(path))
+
+        path_filtered = pathlib.Path(folder_root_path) / 'df_filtered.pkl'
+        pd.to_pickle((df_filtered, unbounded_contract), path_filtered)
+        print(
+            f'\n Synthetic EPEX day with {n_rows} rows, {df_filtered.shape[0]} executed orders in the lead time window')
+
+        results = []
+        context = multiprocessing.get_context('spawn')
+        for engine in ['pivot', 'sort_merge']:
+
+            queue = context.Queue()
+            process = context.Process(
+                target=measure_engine, args=(path_filtered, engine, queue))
+            process.start()
+            results.append(queue.get())
+            process.join()
+
+    df_results = pd.DataFrame(results).set_index('engine')
+    print('\n', df_results)
+    print(
+        f'\n Speedup of the sort merge engine: {df_results.loc["pivot", "seconds"]/df_results.loc["sort_merge", "seconds"]}x')
+
+    return df_results
+
+
+if __name__ == "__main__":
+    benchmark_extract_transactions()
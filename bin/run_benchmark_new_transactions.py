@@ -0,0 +1,51 @@
+import argparse
+import tempfile
+import time
+import pandas as pd
+
+from src.data.helper_closed_transactions import prepare_new_transactions
+from src.data.synthetic_epex import generate_alpiq_month, write_alpiq_month
+
+
+def benchmark_new_transactions(n_rows=300000, month='2019-11-01'):
+
+    with tempfile.TemporaryDirectory() as folder:
+
+        # one synthetic month of ALPIQ transactions
+        path = write_alpiq_month(generate_alpiq_month(
+            month, n_rows=n_rows), folder, month)
+        print(
+            f'\n Synthetic ALPIQ month with {n_rows} transactions written to {path.name}')
+
+        outputs = {}
+        timings = {}
+        for name, vectorized in [('row by row', False), ('vectorized', True)]:
+
+            tic = time.time()
+            outputs[name] = list(prepare_new_transactions(
+                str(path), vectorized=vectorized))
+            timings[name] = time.time()-tic
+            print(f'\n {name} preparation takes {timings[name]} seconds')
+
+    # both preparations give the same daily transactions and file names
+    days_loop, days = outputs.values()
+    assert [file_name for _, file_name in days_loop] == [
+        file_name for _, file_name in days]
+    for (df_day_loop, _), (df_day, _) in zip(days_loop, days):
+        pd.testing.assert_frame_equal(df_day_loop, df_day)
+
+    print(
+        f'\n Identical daily transactions over {len(days)} days, speedup of the vectorized preparation: {timings["row by row"]/timings["vectorized"]}x')
+
+    return timings
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Compare the row by row and vectorized preparation of the ALPIQ transactions on a synthetic month')
+    parser.add_argument('--rows', type=int, default=300000,
+                        help='number of transactions of the synthetic month')
+    args = parser.parse_args()
+
+    benchmark_new_transactions(n_rows=args.rows)
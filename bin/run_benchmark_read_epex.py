@@ -0,0 +1,44 @@
+import tempfile
+import time
+import pandas as pd
+
+from src.data.helper_closed_transactions import read_epex_file
+from src.data.synthetic_epex import generate_epex_day, write_epex_day
+
+
+def benchmark_read_epex_file(n_rows=2000000, day='2019-04-03', repeat=1):
+
+    with tempfile.TemporaryDirectory() as folder_root_path:
+
+        # write one synthetic EPEX day of the requested size
+        df_raw = generate_epex_day(day, n_rows=n_rows)
+        path = write_epex_day(df_raw, folder_root_path, day)
+        print(f'\n Synthetic EPEX day with {n_rows} rows written to {path}')
+
+        timings = {}
+        dfs = {}
+        for vectorized in [False, True]:
+
+            timings[vectorized] = []
+            for _ in range(repeat):
+                tic = time.time()
+                dfs[vectorized] = read_epex_file(path, vectorized=vectorized)
+                toc = time.time()
+                timings[vectorized].append(toc-tic)
+
+        # the two implementations must return the same delivery start and lead time
+        for col in ['Delivery Start', 'lead_time']:
+            pd.testing.assert_series_equal(dfs[False][col], dfs[True][col])
+
+    print(
+        f'\n Row-wise delivery start: loading one file takes {min(timings[False])} seconds')
+    print(
+        f'\n Vectorized delivery start: loading one file takes {min(timings[True])} seconds')
+    print(
+        f'\n Speedup of the vectorized path: {min(timings[False])/min(timings[True])}x')
+
+    return timings
+
+
+if __name__ == "__main__":
+    benchmark_read_epex_file()
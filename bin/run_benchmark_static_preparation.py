@@ -0,0 +1,65 @@
+import argparse
+import pathlib
+import tempfile
+import time
+import pandas as pd
+
+from src.data.synthetic_epex import write_static_data
+from src.data.welfare_complete import read_NTC_file, NTC_preparation, read_pw_file, pw_preparation
+
+
+def benchmark_static_preparation(year=2019, repeat=5):
+
+    with tempfile.TemporaryDirectory() as folder:
+
+        # one synthetic year of NTC and power limit data
+        _, NTC_path, pw_path = write_static_data(
+            pathlib.Path(folder), year=year)
+        NTC = read_NTC_file(str(NTC_path))
+        pw = read_pw_file(str(pw_path))
+
+    preparations = {'NTC_preparation': (NTC_preparation, NTC),
+                    'pw_preparation': (pw_preparation, pw)}
+
+    timings = {}
+    for preparation, (function, df) in preparations.items():
+
+        outputs = {}
+        for name, vectorized in [('row by row', False), ('vectorized', True)]:
+
+            # best of the repetitions, every repetition prepares a fresh copy
+            seconds = []
+            for _ in range(repeat):
+                df_copy = df.copy()
+                tic = time.perf_counter()
+                outputs[name] = function(df_copy, vectorized=vectorized)
+                seconds.append(time.perf_counter()-tic)
+            timings[(preparation, name)] = min(seconds)
+            print(
+                f'\n {name} {preparation} takes {timings[(preparation, name)]} seconds')
+
+        df_loop, df_vectorized = outputs['row by row'], outputs['vectorized']
+
+        # the derived columns are numeric, where the explode path leaves objects
+        assert all(df_vectorized[column].dtype != object
+                   for column in df_vectorized.columns.difference(df.columns))
+        pd.testing.assert_frame_equal(
+            df_loop, df_vectorized, check_dtype=False)
+
+        print(
+            f'\n Identical {preparation} frames with {df_vectorized.shape[0]} rows, speedup of the vectorized preparation: {timings[(preparation, "row by row")]/timings[(preparation, "vectorized")]}x')
+
+    return timings
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Compare the row by row and vectorized preparation of the NTC and power limit data on a synthetic year')
+    parser.add_argument('--year', type=int, default=2019,
+                        help='year of the synthetic static data')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='repetitions of every preparation, the best one is kept')
+    args = parser.parse_args()
+
+    benchmark_static_preparation(year=args.year, repeat=args.repeat)
@@ -0,0 +1,72 @@
+import multiprocessing
+import tempfile
+import time
+import pandas as pd
+
+from src.data.helper_closed_transactions import read_epex_file, filter_lead_time, read_epex_file_filtered
+from src.data.synthetic_epex import generate_epex_day, write_epex_day
+from src.data.profiling import peak_rss_mb, reset_peak_rss
+
+
+def measure_reader(path, chunksize, queue):
+
+    # runs in a fresh process so that the peak RSS only accounts for reading and filtering the day
+    reset_peak_rss()
+    rss_before = peak_rss_mb()
+
+    tic = time.time()
+    if chunksize is None:
+        df_filtered, unbounded_contract = filter_lead_time(
+            read_epex_file(path))
+    else:
+        df_filtered, unbounded_contract = read_epex_file_filtered(
+            path, chunksize=chunksize)
+    toc = time.time()
+
+    rss_after = peak_rss_mb()
+
+    queue.put({'chunksize': chunksize or 'whole file',
+               'seconds': toc-tic,
+               'peak_rss_mb': rss_after,
+               'peak_rss_increase_mb': rss_after-rss_before,
+               'df_filtered': df_filtered,
+               'unbounded_contract': unbounded_contract})
+
+
+def benchmark_streaming_reader(n_rows=2000000, chunksizes=(1000000, 250000), day='2019-04-03'):
+
+    with tempfile.TemporaryDirectory() as folder_root_path:
+
+        # write one synthetic EPEX day of the requested size
+        path = write_epex_day(generate_epex_day(
+            day, n_rows=n_rows), folder_root_path, day)
+        print(f'\n Synthetic EPEX day with {n_rows} rows written to {path}')
+
+        results = []
+        context = multiprocessing.get_context('spawn')
+        for chunksize in [None]+list(chunksizes):
+
+            queue = context.Queue()
+            process = context.Process(
+                target=measure_reader, args=(path, chunksize, queue))
+            process.start()
+            results.append(queue.get())
+            process.join()
+
+    # the streaming reader must return the same filtered LOB of the two-step path
+    for result in results[1:]:
+        pd.testing.assert_frame_equal(
+            results[0]['df_filtered'], result['df_filtered'])
+        assert results[0]['unbounded_contract'] == result['unbounded_contract']
+
+    df_results = pd.DataFrame([{k: v for k, v in result.items() if k not in ['df_filtered', 'unbounded_contract']}
+                               for result in results]).set_index('chunksize')
+    print('\n', df_results)
+    print(
+        f'\n {results[0]["df_filtered"].shape[0]} filtered orders, identical for every chunk size')
+
+    return df_results
+
+
+if __name__ == "__main__":
+    benchmark_streaming_reader()
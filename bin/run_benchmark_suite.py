@@ -0,0 +1,187 @@
+import argparse
+import os
+import pathlib
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+import pandas as pd
+
+from src.data.helper_closed_transactions import read_epex_file, filter_lead_time, extract_transactions
+from src.data.processed_dataset import day_file_name
+from src.data.synthetic_epex import generate_epex_day, write_epex_day, write_static_data
+from src.data.welfare_complete import clean_transactions, read_weekly_prices_file, read_NTC_file, NTC_preparation, match_transactions_both_sides, read_pw_file, pw_preparation, CapacityLedger, WeeklyPrices
+from run_summary_complete_stat import macro_analyis
+
+
+def best_time(function, setup=None, repeat=3):
+
+    # best of the repetitions, the setup of each repetition is not timed
+    seconds = []
+    for _ in range(repeat):
+
+        args = setup() if setup is not None else ()
+        tic = time.perf_counter()
+        output = function(*args)
+        seconds.append(time.perf_counter()-tic)
+
+    return min(seconds), output
+
+
+def git_commit():
+
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_scale(folder, n_rows, static_paths, n_days=7, executed_share=0.1, unbalanced_share=0.001, repeat=3, day='2019-04-03'):
+    """
+    This function times the stages of the complete pipeline on a synthetic EPEX day of the given size
+
+    Args:
+        folder: temporary folder of the benchmark (pathlib.Path)
+        n_rows: number of rows of the synthetic LOB (int)
+        static_paths: synthetic weekly prices, NTC and power limit files (list)
+        n_days: number of daily files of updated transactions summarised by macro_analyis (int)
+        executed_share: share of rows which are executed orders (float)
+        unbalanced_share: share of the buy/sell pairs which cannot be paired back (float)
+        repeat: number of repetitions of every stage, the best one is kept (int)
+        day: delivery day of the synthetic LOB (string)
+    Return:
+        results: seconds and output rows of every stage (list)
+
+    """
+
+    path = write_epex_day(generate_epex_day(day, n_rows=n_rows, executed_share=executed_share,
+                                            unbalanced_share=unbalanced_share), folder / 'external', day)
+
+    wp = WeeklyPrices(read_weekly_prices_file(static_paths[0]))
+    NTC = NTC_preparation(read_NTC_file(static_paths[1]))
+    power_lim = pw_preparation(read_pw_file(static_paths[2]))
+
+    results = []
+
+    seconds, df = best_time(lambda: read_epex_file(path), repeat=repeat)
+    results.append({'stage': 'read_epex_file',
+                   'seconds': seconds, 'rows': df.shape[0]})
+
+    seconds, (df_filtered, unbounded_contract) = best_time(
+        lambda: filter_lead_time(df), repeat=repeat)
+    results.append({'stage': 'filter_lead_time',
+                   'seconds': seconds, 'rows': df_filtered.shape[0]})
+
+    seconds, (pivoted, pivoted_levels) = best_time(lambda: extract_transactions(
+        df_filtered, unbounded_contract=unbounded_contract, engine='sort_merge'), repeat=repeat)
+    results.append({'stage': 'extract_transactions',
+                   'seconds': seconds, 'rows': pivoted_levels.shape[0]})
+
+    # every repetition matches against the untouched capacity state
+    def setup_matching():
+        NTC_copy, power_lim_copy = NTC.copy(), power_lim.copy()
+        return clean_transactions(pivoted_levels), NTC_copy, power_lim_copy, CapacityLedger(NTC_copy, power_lim_copy)
+
+    seconds, pivoted_levels_updated = best_time(lambda transactions, NTC_copy, power_lim_copy, ledger: match_transactions_both_sides(
+        transactions, NTC_copy, wp, power_lim_copy, ledger=ledger, kernel=True), setup=setup_matching, repeat=repeat)
+    results.append({'stage': 'match_transactions_both_sides',
+                   'seconds': seconds, 'rows': pivoted_levels_updated.shape[0]})
+
+    # the matched day is summarised as n_days daily files of the processed folder
+    processed_folder = folder / 'processed' / f'{n_rows}'
+    for delivery_day in pd.date_range(day, periods=n_days):
+        os.makedirs(processed_folder / delivery_day.strftime('%Y-%m') /
+                    'Updated Transactions', exist_ok=True)
+        pivoted_levels_updated.reset_index().to_csv(processed_folder / delivery_day.strftime('%Y-%m') /
+                                                    'Updated Transactions' / day_file_name(delivery_day), index=False)
+
+    summary_folders = iter(folder / 'summary' / f'{n_rows}_{i}' for i in range(repeat))
+    seconds, _ = best_time(lambda: macro_analyis(
+        str(processed_folder), summary_folder=next(summary_folders)), repeat=repeat)
+    results.append({'stage': 'macro_analyis', 'seconds': seconds,
+                   'rows': n_days*pivoted_levels_updated.shape[0]})
+
+    return results
+
+
+def compare_with_baseline(df_results, df_baseline, tolerance=1.2):
+    """
+    This function compares the benchmark results with the latest run of a baseline results file
+
+    Args:
+        df_results: results of the current run (Pandas DataFrame)
+        df_baseline: results of previous runs (Pandas DataFrame)
+        tolerance: ratio of the seconds above which a stage is reported as slower (float)
+    Return:
+        df_comparison: seconds of both runs and their ratio per scale and stage (Pandas DataFrame)
+
+    """
+
+    # runs are appended in time order
+    df_baseline = df_baseline[df_baseline['run'] == df_baseline['run'].iloc[-1]]
+
+    df_comparison = df_results.merge(df_baseline[['n_rows', 'stage', 'seconds']], on=[
+                                     'n_rows', 'stage'], suffixes=('', '_baseline')).set_index(['n_rows', 'stage'])
+    df_comparison['ratio'] = df_comparison['seconds'] / \
+        df_comparison['seconds_baseline']
+    df_comparison['slower'] = df_comparison['ratio'] > tolerance
+
+    return df_comparison[['seconds_baseline', 'seconds', 'ratio', 'slower']]
+
+
+def benchmark_suite(scales=(20000, 200000, 1000000), n_days=7, executed_share=0.1, unbalanced_share=0.001, repeat=3,
+                    results_path='../reports/benchmarks/benchmark_suite.csv', baseline_path=None):
+
+    run = datetime.now().strftime("%d-%m-%Y %H_%M_%S")
+    results = []
+
+    with tempfile.TemporaryDirectory() as folder:
+
+        folder = pathlib.Path(folder)
+        static_paths = write_static_data(folder / 'external')
+
+        for n_rows in scales:
+
+            print(f'\n Benchmarking a synthetic EPEX day with {n_rows} rows')
+            for result in benchmark_scale(folder, n_rows, static_paths, n_days=n_days, executed_share=executed_share,
+                                          unbalanced_share=unbalanced_share, repeat=repeat):
+                results.append({'run': run, 'commit': git_commit(),
+                               'n_rows': n_rows, **result})
+
+    df_results = pd.DataFrame(results)
+    print('\n', df_results.set_index(['n_rows', 'stage'])[['seconds', 'rows']])
+
+    # the previous runs of the results file are the default baseline
+    results_path = pathlib.Path(results_path)
+    baseline_path = baseline_path if baseline_path is not None else results_path
+    if os.path.isfile(baseline_path):
+        df_comparison = compare_with_baseline(
+            df_results, pd.read_csv(baseline_path))
+        with pd.option_context('display.max_columns', None, 'display.width', 200):
+            print('\n Comparison with the baseline run\n', df_comparison)
+
+    os.makedirs(results_path.parent, exist_ok=True)
+    df_results.to_csv(results_path, mode='a',
+                      header=not os.path.isfile(results_path), index=False)
+
+    return df_results
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Time the stages of the complete pipeline on synthetic EPEX days of several sizes')
+    parser.add_argument('--scales', type=int, nargs='+', default=[20000, 200000, 1000000],
+                        help='number of rows of the synthetic EPEX days')
+    parser.add_argument('--days', type=int, default=7,
+                        help='number of daily files summarised by macro_analyis')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='repetitions of every stage, the best one is kept')
+    parser.add_argument('--results-path', default='../reports/benchmarks/benchmark_suite.csv',
+                        help='csv file the results are appended to')
+    parser.add_argument('--baseline-path', default=None,
+                        help='results file to compare with, by default the previous runs of the results file')
+    args = parser.parse_args()
+
+    benchmark_suite(scales=args.scales, n_days=args.days, repeat=args.repeat,
+                    results_path=args.results_path, baseline_path=args.baseline_path)
@@ -0,0 +1,47 @@
+import argparse
+import os
+import time
+import pandas as pd
+
+from src.data.welfare_complete import write_static_bundle, read_static_bundle, load_static_data
+
+
+def build_static_bundle(static_paths, bundle_path='../data/interim/static_data_2019.bundle'):
+
+    tic = time.time()
+    write_static_bundle(static_paths, bundle_path)
+    print(
+        f'\n Static data bundle of {os.path.getsize(bundle_path)/2**20:.1f} MB written to {bundle_path} in {time.time()-tic} seconds')
+
+    # the bundle gives back the frames prepared from the csv files
+    tic = time.time()
+    frames_csv = load_static_data(static_paths)
+    toc_csv = time.time()-tic
+
+    tic = time.time()
+    frames_bundle = read_static_bundle(bundle_path, static_paths=static_paths)
+    toc_bundle = time.time()-tic
+
+    for df_csv, df_bundle in zip(frames_csv, frames_bundle):
+        pd.testing.assert_frame_equal(df_csv, df_bundle)
+
+    print(
+        f'\n Identical static data, loading takes {toc_csv} seconds from the csv files and {toc_bundle} seconds from the bundle')
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Prepare the weekly prices, NTC and power limit files once into the bundle loaded by the pipelines and the dashboard')
+    parser.add_argument('--weekly-prices', default='../data/external/Hydro Generation and Price_CH_2019.csv',
+                        help='weekly hydro prices file')
+    parser.add_argument('--ntc', default='../data/external/NTC_DEandCH_2019.csv',
+                        help='NTC file')
+    parser.add_argument('--power-limit', default='../data/external/Hydro Generation up- downscale Potential_CH_2019.csv',
+                        help='power limit file')
+    parser.add_argument('--bundle-path', default='../data/interim/static_data_2019.bundle',
+                        help='location of the bundle')
+    args = parser.parse_args()
+
+    build_static_bundle([args.weekly_prices, args.ntc, args.power_limit],
+                        bundle_path=args.bundle_path)
@@ -0,0 +1,47 @@
+import argparse
+import time
+
+from src.data.summary_complete import load_transactions, daily_summary, daily_summary_loop
+
+
+def compare_summary_engines(folder_root_path, repeat=3):
+
+    # updated transactions of every day loaded once and shared by both engines
+    df_transactions = load_transactions(folder_root_path)
+
+    outputs = {}
+    timings = {}
+    for engine, function in [('loop', daily_summary_loop), ('grouped', daily_summary)]:
+
+        # best of the repetitions
+        seconds = []
+        for _ in range(repeat):
+            tic = time.perf_counter()
+            df_summary = function(df_transactions)
+            seconds.append(time.perf_counter()-tic)
+        timings[engine] = min(seconds)
+
+        # the summary csv as written by macro_analyis
+        outputs[engine] = df_summary.to_csv(index=False)
+
+    assert outputs['grouped'] == outputs['loop'], 'the grouped engine writes a different summary csv than the day by day engine'
+
+    print(
+        f'\n Identical summary csv of {df_transactions["day"].nunique()} days, the day by day engine takes {timings["loop"]} seconds and the grouped engine {timings["grouped"]} seconds')
+    print(
+        f'\n Speedup of the grouped summary: {timings["loop"]/timings["grouped"]}x')
+
+    return timings
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Check the grouped summary against the day by day summary of a complete pipeline run')
+    parser.add_argument('folder_root_path',
+                        help='processed folder of a complete pipeline run')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='repetitions of every engine, the best one is kept')
+    args = parser.parse_args()
+
+    compare_summary_engines(args.folder_root_path, repeat=args.repeat)
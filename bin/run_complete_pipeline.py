@@ -1,33 +1,203 @@
+import argparse
 import glob
 import os
 import pathlib
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 import pandas as pd
 import time
 from datetime import datetime
 
-from src.data.helper_closed_transactions import read_epex_file, filter_lead_time, extract_transactions
-from src.data.welfare_complete import clean_transactions, read_weekly_prices_file, read_NTC_file, NTC_preparation, match_transactions_both_sides, read_pw_file, pw_preparation
+from src.data.helper_closed_transactions import read_epex_file, read_epex_file_filtered, filter_lead_time, extract_transactions, partition_lead_time, INSTRUMENT_TYPE_DURATION
+from src.data.epex_cache import EpexCache
+from src.data.processed_dataset import write_day, write_lead_time_bins
+from src.data.profiling import StageMetrics
+from src.data.run_manifest import RunManifest
+from src.data.welfare_complete import clean_transactions, load_static_data, match_transactions_both_sides, slice_capacity, restore_capacity, CapacityLedger, WeeklyPrices
 
 
-def complete_pipeline(folder_root_path='../data/external/EPEX_spot_continous_2019'):
+def derive_day(opath, cache=None, legacy_key=False, chunksize=None, metrics=None, lead_time_bins=None, bins_folder=None):
+
+    #### Daily Transaction Derivation ####
+
+    # the stages are measured in a throwaway recorder when the run keeps no metrics
+    metrics = metrics if metrics is not None else StageMetrics()
+    day = pd.Timestamp(opath.split('/')[-1].split('.')[0][-8:])
+
+    if chunksize:
+        # streaming the daily csv file, keeping only the window of time of interest
+        with metrics.stage(day, 'read_epex_file_filtered') as record:
+            df_filtered, unbounded_contract = read_epex_file_filtered(
+                opath, chunksize=chunksize, legacy_key=legacy_key)
+            record['rows'] = df_filtered.shape[0]
+
+    else:
+        # loading the daily csv file at day
+        with metrics.stage(day, 'read_epex_file') as record:
+            df = read_epex_file(opath, cache=cache, legacy_key=legacy_key)
+            record['rows'] = df.shape[0]
+
+        # executed orders bucketed by lead time for the derivation of other windows
+        if lead_time_bins is not None:
+            with metrics.stage(day, 'partition_lead_time') as record:
+                partitions = partition_lead_time(df, bins=lead_time_bins)
+                write_lead_time_bins(partitions, bins_folder, day)
+                record['rows'] = sum(
+                    df_bin.shape[0] for df_bin in partitions.values())
+
+        # filtering the daily csv file for the window of time of interest
+        with metrics.stage(day, 'filter_lead_time') as record:
+            df_filtered, unbounded_contract = filter_lead_time(df)
+            record['rows'] = df_filtered.shape[0]
+
+    # derive transactions
+    with metrics.stage(day, 'extract_transactions') as record:
+        pivoted, pivoted_levels, dropped = extract_transactions(
+            df_filtered, unbounded_contract=unbounded_contract, engine='sort_merge', return_dropped=True, legacy_key=legacy_key)
+        record['rows'] = pivoted_levels.shape[0]
+
+    return df_filtered, pivoted_levels, dropped
+
+
+def match_day(opath, pivoted_levels, NTC, wp, power_lim, ledger, metrics):
+
+    #### Welfare Model ####
+
+    day = pd.Timestamp(opath.split('/')[-1].split('.')[0][-8:])
+    with metrics.stage(day, 'match_transactions_both_sides') as record:
+        pivoted_levels_updated = match_transactions_both_sides(
+            clean_transactions(pivoted_levels), NTC, wp, power_lim, ledger=ledger, kernel=True)
+        record['rows'] = pivoted_levels_updated.shape[0]
+
+    return pivoted_levels_updated
+
+
+def delivery_window(pivoted_levels):
+
+    # time span covered by the delivery of the transactions of a day
+    delivery_end = pivoted_levels['Delivery Start_B'] + \
+        pivoted_levels['Instrument Type_B'].map(INSTRUMENT_TYPE_DURATION)
+
+    return pivoted_levels['Delivery Start_B'].min(), delivery_end.max()
+
+
+def process_day_window(task):
+
+    # worker of the parallel mode: the welfare model runs on the capacity slots of the delivery day only
+    opath, day_start, day_end, NTC_window, power_lim_window, wp, cache, legacy_key, chunksize, trace_memory, lead_time_bins, bins_folder = task
+
+    # the cache statistics are sent back to the main process as the difference made by this day
+    if cache is not None:
+        cache.hits, cache.misses, cache.invalidated = 0, 0, 0
+
+    # the stage records of the day are sent back to the main process which writes them
+    metrics = StageMetrics(trace_memory=trace_memory)
+
+    df_filtered, pivoted_levels, dropped = derive_day(
+        opath, cache=cache, legacy_key=legacy_key, chunksize=chunksize, metrics=metrics, lead_time_bins=lead_time_bins, bins_folder=bins_folder)
+
+    # transactions delivered outside the day would need capacity of other days
+    start, end = delivery_window(pivoted_levels)
+    if start >= day_start and end <= day_end:
+        ledger = CapacityLedger(NTC_window, power_lim_window)
+        pivoted_levels_updated = match_day(
+            opath, pivoted_levels, NTC_window, wp, power_lim_window, ledger, metrics)
+        ledger.update_frames(NTC_window, power_lim_window)
+    else:
+        pivoted_levels_updated = None
+
+    cache_stat = (cache.hits, cache.misses,
+                  cache.invalidated) if cache is not None else None
+
+    return df_filtered, pivoted_levels, dropped, pivoted_levels_updated, NTC_window, power_lim_window, cache_stat, metrics.pop_records()
+
+
+def save_day(base_interim_folder, base_processed_folder, opath, df_filtered, pivoted_levels, pivoted_levels_updated, output_format='csv', metrics=None):
+
+    day = pd.Timestamp(opath.split('/')[-1].split('.')[0][-8:])
+    with (metrics if metrics is not None else StageMetrics()).stage(day, 'save_day') as record:
+        write_outputs(base_interim_folder, base_processed_folder, opath,
+                      df_filtered, pivoted_levels, pivoted_levels_updated, output_format=output_format)
+        record['rows'] = pivoted_levels_updated.shape[0]
+
+
+def write_outputs(base_interim_folder, base_processed_folder, opath, df_filtered, pivoted_levels, pivoted_levels_updated, output_format='csv'):
+
+    if output_format == 'parquet':
+
+        # one month partitioned dataset per stage
+        day = pd.Timestamp(opath.split('/')[-1].split('.')[0][-8:])
+        write_day(df_filtered, base_interim_folder, 'Filtered Orders', day)
+        write_day(pivoted_levels, base_interim_folder, 'Transactions', day)
+        write_day(pivoted_levels_updated.reset_index(),
+                  base_processed_folder, 'Updated Transactions', day)
+
+        return
+
+    file_name = 'DE_'+opath.split('/')[-1].split(' ')[-1]
+    folder_month = pathlib.Path(opath).parent.name.split(' ')[-1]
+    folder_name_df_filtered = 'Filtered Orders'
+    folder_name_df_transactions = 'Transactions'
+    folder_name_updated_transactions = 'Updated Transactions'
+
+    # save files to csv
+    os.makedirs(base_interim_folder / folder_month /
+                folder_name_df_filtered, exist_ok=True)
+    os.makedirs(base_interim_folder / folder_month /
+                folder_name_df_transactions, exist_ok=True)
+
+    df_filtered.to_csv(base_interim_folder / folder_month /
+                       folder_name_df_filtered / file_name, index=False)
+
+    pivoted_levels.to_csv(base_interim_folder / folder_month /
+                          folder_name_df_transactions / file_name, index=False)
+
+    #### Save Files to csv ####
+    os.makedirs(base_processed_folder / folder_month /
+                folder_name_updated_transactions, exist_ok=True)
+
+    pivoted_levels_updated.reset_index().to_csv(base_processed_folder / folder_month /
+                                                folder_name_updated_transactions / file_name, index=False)
+
+
+def save_dropped_report(base_interim_folder, ordered_paths, dropped_reports):
+
+    # orders dropped because of unbalanced end validity dates, per day and delivery hour
+    days = [pd.Timestamp(opath.split('/')[-1].split('.')[0][-8:])
+            for opath in ordered_paths]
+    df_dropped = pd.concat(dropped_reports, keys=days, names=['Day'])
+    df_dropped.to_csv(base_interim_folder /
+                      'Dropped Trades per Delivery Hour.csv')
+
+    print(
+        f'\n {df_dropped["Dropped Buy Orders"].sum()} buy and {df_dropped["Dropped Sell Orders"].sum()} sell orders were dropped because of unbalanced end validity dates')
+
+
+def complete_pipeline(folder_root_path='../data/external/EPEX_spot_continous_2019', use_cache=True, cache_folder='../data/interim/EPEX_cache', rebuild_cache=False, workers=1, legacy_key=False, chunksize=None, output_format='csv', resume=None, trace_memory=False, lead_time_bins=None,
+                      static_bundle='../data/interim/static_data_2019.bundle'):
 
     tic = time.time()
 
-    # load static data
+    # the streaming reader only keeps the orders of the lead window
+    if chunksize and lead_time_bins is not None:
+        raise ValueError(
+            'The lead time bins are derived from the whole parsed day, they cannot be written while streaming')
 
-    # load weekly hydro prices
-    wp = read_weekly_prices_file(
-        "../data/external/Hydro Generation and Price_CH_2019.csv")
+    # on-disk cache of the parsed EPEX days, the streaming reader never holds a whole day
+    cache = EpexCache(
+        cache_folder, rebuild=rebuild_cache) if use_cache and not chunksize else None
 
-    # load NTC
-    NTC = read_NTC_file("../data/external/NTC_DEandCH_2019.csv")
-    NTC = NTC_preparation(NTC)
+    # load static data
+    static_paths = ["../data/external/Hydro Generation and Price_CH_2019.csv",
+                    "../data/external/NTC_DEandCH_2019.csv",
+                    "../data/external/Hydro Generation up- downscale Potential_CH_2019.csv"]
+
+    # weekly hydro prices, prepared NTC and power limit data, from the static data bundle when it is up to date
+    wp, NTC, power_lim = load_static_data(
+        static_paths, bundle_path=static_bundle)
 
-    # load power limit data
-    power_lim = read_pw_file(
-        "../data/external/Hydro Generation up- downscale Potential_CH_2019.csv")
-    power_lim = pw_preparation(power_lim)
+    # weekly hydro prices indexed once for the lookup of every transaction
+    wp = WeeklyPrices(wp)
 
     time_ = []
     paths = []
@@ -46,87 +216,178 @@ def complete_pipeline(folder_root_path='../data/external/EPEX_spot_continous_201
     # order the path correctly in time
     ordered_paths = [x for _, x in sorted(zip(time_, paths))]
 
-    # time process
-    time_pipeline_process = datetime.now().strftime("%d-%m-%Y %H_%M_%S")
+    if resume is None:
+        # time process
+        time_pipeline_process = datetime.now().strftime("%d-%m-%Y %H_%M_%S")
 
-    # create interim folder
-    base_interim_folder = pathlib.Path(
-        r'../data/interim') / f'EPEX_spot_continous_complete_pipeline_2019_{time_pipeline_process}'
+        # create interim folder
+        base_interim_folder = pathlib.Path(
+            r'../data/interim') / f'EPEX_spot_continous_complete_pipeline_2019_{time_pipeline_process}'
+        os.makedirs(base_interim_folder)
+    else:
+        # a resumed run continues in the given interim folder, which must hold the manifest of the interrupted run
+        base_interim_folder = pathlib.Path(resume)
+        if not os.path.isfile(base_interim_folder / 'run_manifest.json'):
+            raise ValueError(
+                f'{resume} is not the interim folder of an interrupted run, it has no run_manifest.json to resume from')
 
-    base_processed_folder = pathlib.Path(
-        r'../data/processed') / f'EPEX_spot_continous_complete_pipeline_2019_{time_pipeline_process}'
-    os.makedirs(base_interim_folder)
+    # processed folder of the same name next to the interim folders
+    base_processed_folder = base_interim_folder.parent.parent / \
+        'processed' / base_interim_folder.name
 
-    for opath in tqdm(ordered_paths):
+    # days completed by an interrupted run are skipped and the capacity state left after them restored
+    manifest = RunManifest(base_interim_folder, options={'legacy_key': legacy_key, 'output_format': output_format},
+                           static_paths=static_paths)
+    n_done = manifest.resume(ordered_paths, NTC, power_lim)
+    dropped_reports = manifest.dropped_reports()
 
-        file_name = 'DE_'+opath.split('/')[-1].split(' ')[-1]
-        folder_month = opath.split('/')[4].split(' ')[-1]
-        folder_name_df_filtered = 'Filtered Orders'
-        folder_name_df_transactions = 'Transactions'
-        folder_name_updated_transactions = 'Updated Transactions'
+    # time, memory and rows of every stage of every day, a restarted run measures its days again
+    metrics = StageMetrics(base_interim_folder / 'run_metrics.csv',
+                           trace_memory=trace_memory)
+    if n_done == 0 and os.path.isfile(metrics.path):
+        os.remove(metrics.path)
 
-        #### Daily Transaction Derivation ####
+    if workers > 1:
+        dropped_reports += complete_pipeline_parallel(ordered_paths[n_done:], NTC, wp, power_lim, cache,
+                                                      base_interim_folder, base_processed_folder, workers, legacy_key, chunksize, output_format, manifest, metrics, lead_time_bins)
 
-        # loading the daily csv file at day
-        df = read_epex_file(opath)
+    else:
+        # array-backed capacity state shared by all the days
+        ledger = CapacityLedger(NTC, power_lim)
 
-        # filtering the daily csv file for the window of time of interest
-        df_filtered, unbounded_contract = filter_lead_time(df)
+        for opath in tqdm(ordered_paths[n_done:]):
 
-        # derive transactions
-        pivoted, pivoted_levels = extract_transactions(
-            df_filtered, unbounded_contract=unbounded_contract)
+            df_filtered, pivoted_levels, dropped = derive_day(
+                opath, cache=cache, legacy_key=legacy_key, chunksize=chunksize, metrics=metrics, lead_time_bins=lead_time_bins, bins_folder=base_interim_folder)
+            dropped_reports.append(dropped)
 
-        # save files to csv
-        if os.path.isdir(base_interim_folder / folder_month):
+            pivoted_levels_updated = match_day(
+                opath, pivoted_levels, NTC, wp, power_lim, ledger, metrics)
 
-            df_filtered.to_csv(base_interim_folder / folder_month /
-                               folder_name_df_filtered / file_name, index=False)
+            save_day(base_interim_folder, base_processed_folder, opath,
+                     df_filtered, pivoted_levels, pivoted_levels_updated, output_format=output_format, metrics=metrics)
 
-            pivoted_levels.to_csv(base_interim_folder / folder_month /
-                                  folder_name_df_transactions / file_name, index=False)
+            ledger.update_frames(NTC, power_lim)
+            manifest.record_day(opath, dropped, NTC, power_lim)
+            metrics.flush()
 
-        else:
+    save_dropped_report(base_interim_folder, ordered_paths, dropped_reports)
 
-            os.makedirs(base_interim_folder / folder_month)
+    toc = time.time()
+    print(
+        f'\n Reading, processing and deriving the possible transactions completely takes {toc-tic} seconds')
 
-            os.makedirs(base_interim_folder /
-                        folder_month / folder_name_df_filtered)
-            os.makedirs(base_interim_folder /
-                        folder_month / folder_name_df_transactions)
+    if cache is not None:
+        cache.report()
 
-            df_filtered.to_csv(base_interim_folder / folder_month /
-                               folder_name_df_filtered / file_name, index=False)
+    metrics.report()
 
-            pivoted_levels.to_csv(base_interim_folder / folder_month /
-                                  folder_name_df_transactions / file_name, index=False)
 
-        #### Welfare Model ####
+def complete_pipeline_parallel(ordered_paths, NTC, wp, power_lim, cache, base_interim_folder, base_processed_folder, workers, legacy_key=False, chunksize=None, output_format='csv', manifest=None, metrics=None, lead_time_bins=None):
 
-        pivoted_levels = clean_transactions(pivoted_levels)
-        pivoted_levels_updated = match_transactions_both_sides(
-            pivoted_levels, NTC, wp, power_lim)
+    # the capacity state is only shared through the slots of each delivery day, which are disjoint:
+    # every worker gets its own copy of the day slots and the updated slots are written back in day order
+    tasks = []
+    windows = []
+    for opath in ordered_paths:
 
-        #### Save Files to csv ####
-        if os.path.isdir(base_processed_folder / folder_month):
+        day_start = pd.Timestamp(opath.split('/')[-1].split('.')[0][-8:], tz='UTC')
+        day_end = day_start+pd.Timedelta(1, unit='days')
+        NTC_window, power_lim_window, index_NTC, index_pw = slice_capacity(
+            NTC, power_lim, day_start, day_end)
 
-            pivoted_levels_updated.reset_index().to_csv(base_processed_folder / folder_month /
-                                                        folder_name_updated_transactions / file_name, index=False)
+        tasks.append((opath, day_start, day_end, NTC_window,
+                      power_lim_window, wp, cache, legacy_key, chunksize, metrics is not None and metrics.trace_memory,
+                      lead_time_bins, base_interim_folder))
+        windows.append((day_start, day_end, index_NTC, index_pw))
 
-        else:
+    # time spans of the capacity updated outside the day slots by days matched sequentially
+    dirty_windows = []
+    dropped_reports = []
 
-            os.makedirs(base_processed_folder / folder_month)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
 
-            os.makedirs(base_processed_folder /
-                        folder_month / folder_name_updated_transactions)
+        results = executor.map(process_day_window, tasks)
 
-            pivoted_levels_updated.reset_index().to_csv(base_processed_folder / folder_month /
-                                                        folder_name_updated_transactions / file_name, index=False)
+        for opath, (day_start, day_end, index_NTC, index_pw), result in tqdm(zip(ordered_paths, windows, results), total=len(tasks)):
 
-    toc = time.time()
-    print(
-        f'\n Reading, processing and deriving the possible transactions completely takes {toc-tic} seconds')
+            df_filtered, pivoted_levels, dropped, pivoted_levels_updated, NTC_window, power_lim_window, cache_stat, records = result
+            dropped_reports.append(dropped)
+
+            if metrics is None:
+                metrics = StageMetrics()
+            metrics.records += records
+
+            if cache_stat is not None:
+                cache.hits += cache_stat[0]
+                cache.misses += cache_stat[1]
+                cache.invalidated += cache_stat[2]
+
+            stale = any(start < day_end and end > day_start for start,
+                        end in dirty_windows)
+
+            if pivoted_levels_updated is None or stale:
+
+                # fall back to the sequential welfare model on the whole capacity state
+                ledger = CapacityLedger(NTC, power_lim)
+                pivoted_levels_updated = match_day(
+                    opath, pivoted_levels, NTC, wp, power_lim, ledger, metrics)
+                ledger.update_frames(NTC, power_lim)
+                dirty_windows.append(delivery_window(pivoted_levels))
+
+            else:
+                restore_capacity(NTC, power_lim, NTC_window,
+                                 power_lim_window, index_NTC, index_pw)
+
+            save_day(base_interim_folder, base_processed_folder, opath,
+                     df_filtered, pivoted_levels, pivoted_levels_updated, output_format=output_format, metrics=metrics)
+
+            if manifest is not None:
+                manifest.record_day(opath, dropped, NTC, power_lim)
+            metrics.flush()
+
+    return dropped_reports
 
 
 if __name__ == "__main__":
-    complete_pipeline()
+
+    parser = argparse.ArgumentParser(
+        description='Derive and match the 2019 EPEX transactions with the Swiss hydro flexibility')
+    parser.add_argument('--folder-root-path', default='../data/external/EPEX_spot_continous_2019',
+                        help='folder containing the monthly EPEX LOB folders')
+    parser.add_argument('--cache-folder', default='../data/interim/EPEX_cache',
+                        help='folder of the on-disk cache of parsed EPEX days')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always parse the raw csv files without consulting the cache')
+    parser.add_argument('--rebuild-cache', action='store_true',
+                        help='parse every raw csv file again and overwrite the cached days')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of worker processes, 1 runs the days sequentially')
+    parser.add_argument('--legacy-key', action='store_true',
+                        help="write the 'Executed Price & Volume' tuple columns of the former file layout")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream the raw csv files in chunks of this many rows instead of loading whole days, bypasses the cache')
+    parser.add_argument('--resume', default=None,
+                        help='interim folder of an interrupted run to complete, its finished days are skipped')
+    parser.add_argument('--output-format', choices=['csv', 'parquet'], default='csv',
+                        help='write daily csv files or one month partitioned Parquet dataset per stage')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='also record the peak memory traced by tracemalloc in the run metrics, slowing down the run')
+    parser.add_argument('--lead-time-bins', type=int, nargs='+', default=None,
+                        help='also write the executed orders of every day bucketed by these lead time edges in minutes, e.g. 0 5 15 30 60')
+    parser.add_argument('--static-bundle', default='../data/interim/static_data_2019.bundle',
+                        help='bundle of the prepared static data written by run_build_static_bundle.py, the csv files are read when it is missing or outdated')
+    args = parser.parse_args()
+
+    complete_pipeline(folder_root_path=args.folder_root_path,
+                      use_cache=not args.no_cache,
+                      cache_folder=args.cache_folder,
+                      rebuild_cache=args.rebuild_cache,
+                      workers=args.workers,
+                      legacy_key=args.legacy_key,
+                      chunksize=args.chunksize,
+                      output_format=args.output_format,
+                      resume=args.resume,
+                      trace_memory=args.trace_memory,
+                      lead_time_bins=args.lead_time_bins,
+                      static_bundle=args.static_bundle)
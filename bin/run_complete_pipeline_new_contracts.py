@@ -1,33 +1,168 @@
+import argparse
 import glob
 import os
 import pathlib
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 import pandas as pd
 import time
 from datetime import datetime
 
 from src.data.helper_closed_transactions import read_epex_file, filter_lead_time, extract_transactions, prepare_new_transactions
-from src.data.welfare_complete import clean_transactions, clean_transactions_new, read_weekly_prices_file, read_NTC_file, NTC_preparation, match_transactions_both_sides, read_pw_file, pw_preparation
+from src.data.welfare_complete import clean_transactions, clean_transactions_new, load_static_data, match_transactions_both_sides, CapacityLedger
 
 
-def complete_pipeline(folder_root_path='../data/external/prepared_EPEX_2019_Nov_Dec'):
+def write_csv(df, path):
 
-    tic = time.time()
+    os.makedirs(path.parent, exist_ok=True)
+    df.to_csv(path, index=False)
+
+
+class CsvWriter:
+    """
+    I/O thread writing the daily csv files in the order they are handed over. The queue of pending files is
+    bounded, so that the matching waits for the writes instead of piling frames up in memory. A failed write is
+    raised before the next day is matched, the files still queued at that time being the only days matched in vain
+
+    Args:
+        queue_size: maximum number of daily files waiting to be written (int)
+
+    """
+
+    def __init__(self, queue_size=8):
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+
+            # after a failed write the remaining files are dropped, the error is raised in the main thread
+            if self.error is None:
+                try:
+                    write_csv(*job)
+                except Exception as error:
+                    self.error = error
+
+    def check(self):
+
+        # raises the error of a failed write
+        if self.error is not None:
+            raise self.error
+
+    def write(self, df, path):
+
+        self.check()
+        self.queue.put((df, path))
+
+    def close(self, raise_error=True):
+
+        # the pending files are written before returning, the error of a failed write is only raised when no
+        # other error is being handled, so that it never hides the error which stopped the run
+        self.queue.put(None)
+        self.thread.join()
+
+        if raise_error:
+            self.check()
+
+
+def prepare_file(path):
+
+    # runs in the background worker, the days of the file are sent back as a list
+    return list(prepare_new_transactions(path))
+
+
+def prepared_files(ordered_paths, pipelined=False):
+
+    # prepared days of each file, in the pipelined mode the next file is prepared by a background worker
+    if not pipelined:
+        for opath in ordered_paths:
+            yield opath, prepare_file(opath)
+        return
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+
+        future = executor.submit(prepare_file, ordered_paths[0])
+        for i in range(len(ordered_paths)):
+
+            days = future.result()
+            if i+1 < len(ordered_paths):
+                future = executor.submit(prepare_file, ordered_paths[i+1])
 
-    # load static data
+            yield ordered_paths[i], days
 
-    # load weekly hydro prices
-    wp = read_weekly_prices_file(
-        "../data/external/Hydro Generation and Price_CH_2019.csv")
 
-    # load NTC
-    NTC = read_NTC_file("../data/external/NTC_DEandCH_2019.csv")
-    NTC = NTC_preparation(NTC)
+def merged_day(frames):
 
-    # load power limit data
-    power_lim = read_pw_file(
-        "../data/external/Hydro Generation up- downscale Potential_CH_2019.csv")
-    power_lim = pw_preparation(power_lim)
+    # the rows of a date spread over several files are renumbered, their row numbers in each file overlapping
+    if len(frames) == 1:
+        return frames[0]
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def prepared_days(ordered_paths, pipelined=False):
+    """
+    This function hands out the prepared days of the ALPIQ files in time order. A delivery date can be spread
+    over several files, e.g. at the turn of a month or a year, so the days of a file are held until the next
+    file is prepared and merged with the transactions of the same date found there. In the pipelined mode the
+    next file is prepared by a background worker while the days of the current one are consumed
+
+    Args:
+        ordered_paths: ALPIQ files ordered in time (list)
+        pipelined: deciding whether to prepare the next file in a background worker (bool)
+    Return:
+        days: transactions of each delivery date with the name of their daily file (generator)
+
+    """
+
+    # frames of the delivery dates not handed out yet by name of their daily file, which sort in time
+    pending = {}
+    last_name = None
+
+    for opath, days in prepared_files(ordered_paths, pipelined=pipelined):
+
+        # the dates before the first date of this file are complete
+        first_name = min(name for _, name in days) if days else None
+        for name in sorted(pending):
+            if first_name is not None and name >= first_name:
+                break
+            yield merged_day(pending.pop(name)), name
+            last_name = name
+
+        for df_day, name in days:
+            # a day already matched and written is never overwritten
+            if last_name is not None and name <= last_name:
+                raise ValueError(
+                    f'{opath} holds transactions delivered on {name[3:11]}, while the days up to {last_name[3:11]} are already matched and written. The ID_GDM files are not ordered by delivery date')
+            pending.setdefault(name, []).append(df_day)
+
+    for name in sorted(pending):
+        yield merged_day(pending[name]), name
+
+
+def complete_pipeline(folder_root_path='../data/external/prepared_EPEX_2019_Nov_Dec', pipelined=False, queue_size=8,
+                      static_bundle='../data/interim/static_data_2019.bundle'):
+
+    tic = time.time()
+
+    # load static data: weekly hydro prices, prepared NTC and power limit data, from the bundle when it is up to date
+    static_paths = ["../data/external/Hydro Generation and Price_CH_2019.csv",
+                    "../data/external/NTC_DEandCH_2019.csv",
+                    "../data/external/Hydro Generation up- downscale Potential_CH_2019.csv"]
+    wp, NTC, power_lim = load_static_data(
+        static_paths, bundle_path=static_bundle)
+
+    # array-backed capacity state shared by all the days
+    ledger = CapacityLedger(NTC, power_lim)
 
     time_ = []
     paths = []
@@ -57,56 +192,44 @@ def complete_pipeline(folder_root_path='../data/external/prepared_EPEX_2019_Nov_
         r'../data/processed') / f'ALPIQ_transactions_complete_pipeline_2019_{time_pipeline_process}'
     os.makedirs(base_interim_folder)
 
-    for opath in tqdm(ordered_paths):
-
-        f_m = opath.split('/')[-1].split('_')[-1].split('.')[0]
-        folder_month = f_m[:-4]+'-'+f_m[-4:-2]
+    folder_name_df_transactions = 'Transactions'
+    folder_name_updated_transactions = 'Updated Transactions'
 
-        folder_name_df_transactions = 'Transactions'
-        folder_name_updated_transactions = 'Updated Transactions'
+    # in the pipelined mode the files are written by the I/O thread while the next days are matched
+    writer = CsvWriter(queue_size=queue_size) if pipelined else None
+    save = writer.write if pipelined else write_csv
 
-        #### Daily Transaction Preparation ####
+    try:
+        # the days of the files, which can span several months, are handed out one at a time
+        for pivoted_levels, file_name in tqdm(prepared_days(ordered_paths, pipelined=pipelined), unit='days'):
 
-        pivoted_levels_list, file_names = prepare_new_transactions(opath)
-
-        for pivoted_levels, file_name in zip(pivoted_levels_list, file_names):
+            folder_month = pd.Timestamp(
+                file_name.split('.')[0][-8:]).strftime('%Y-%m')
 
             # save files to csv
-            if os.path.isdir(base_interim_folder / folder_month):
-
-                pivoted_levels.to_csv(base_interim_folder / folder_month /
-                                      folder_name_df_transactions / file_name, index=False)
-
-            else:
-
-                os.makedirs(base_interim_folder / folder_month)
-
-                os.makedirs(base_interim_folder /
-                            folder_month / folder_name_df_transactions)
-
-                pivoted_levels.to_csv(base_interim_folder / folder_month /
-                                      folder_name_df_transactions / file_name, index=False)
+            save(pivoted_levels, base_interim_folder / folder_month /
+                 folder_name_df_transactions / file_name)
 
             #### Welfare Model ####
+            if writer is not None:
+                writer.check()
             pivoted_levels = clean_transactions_new(pivoted_levels)
             pivoted_levels_updated = match_transactions_both_sides(
-                pivoted_levels, NTC, wp, power_lim)
+                pivoted_levels, NTC, wp, power_lim, ledger=ledger, kernel=True)
 
             #### Save Files to csv ####
-            if os.path.isdir(base_processed_folder / folder_month):
+            save(pivoted_levels_updated.reset_index(), base_processed_folder / folder_month /
+                 folder_name_updated_transactions / file_name)
 
-                pivoted_levels_updated.reset_index().to_csv(base_processed_folder / folder_month /
-                                                            folder_name_updated_transactions / file_name, index=False)
+    except BaseException:
+        if writer is not None:
+            writer.close(raise_error=False)
+        raise
 
-            else:
+    if writer is not None:
+        writer.close()
 
-                os.makedirs(base_processed_folder / folder_month)
-
-                os.makedirs(base_processed_folder /
-                            folder_month / folder_name_updated_transactions)
-
-                pivoted_levels_updated.reset_index().to_csv(base_processed_folder / folder_month /
-                                                            folder_name_updated_transactions / file_name, index=False)
+    ledger.update_frames(NTC, power_lim)
 
     toc = time.time()
     print(
@@ -114,4 +237,20 @@ def complete_pipeline(folder_root_path='../data/external/prepared_EPEX_2019_Nov_
 
 
 if __name__ == "__main__":
-    complete_pipeline()
+
+    parser = argparse.ArgumentParser(
+        description='Prepare and match the ALPIQ transactions with the Swiss hydro flexibility')
+    parser.add_argument('--folder-root-path', default='../data/external/prepared_EPEX_2019_Nov_Dec',
+                        help='folder containing the ID_GDM files')
+    parser.add_argument('--pipelined', action='store_true',
+                        help='prepare the next file in a background worker and write the csv files on an I/O thread')
+    parser.add_argument('--queue-size', type=int, default=8,
+                        help='maximum number of daily files waiting to be written in the pipelined mode')
+    parser.add_argument('--static-bundle', default='../data/interim/static_data_2019.bundle',
+                        help='bundle of the prepared static data written by run_build_static_bundle.py, the csv files are read when it is missing or outdated')
+    args = parser.parse_args()
+
+    complete_pipeline(folder_root_path=args.folder_root_path,
+                      pipelined=args.pipelined,
+                      queue_size=args.queue_size,
+                      static_bundle=args.static_bundle)
@@ -0,0 +1,216 @@
+import argparse
+import glob
+import os
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import product
+from tqdm import tqdm
+import pandas as pd
+import time
+
+from src.data.helper_closed_transactions import read_epex_file, filter_lead_time, extract_transactions
+from src.data.epex_cache import EpexCache
+from src.data.processed_dataset import day_file_name, lead_time_bin_days, read_lead_window
+from src.data.summary_complete import daily_summary
+from src.data.welfare_complete import clean_transactions, read_weekly_prices_file, read_NTC_file, NTC_preparation, match_transactions_both_sides, read_pw_file, pw_preparation, CapacityLedger, WeeklyPrices
+
+# summary columns added up over the days of a scenario
+SCENARIO_TOTALS = ['Total Volume Traded', 'Total Volume Traded CH-DE', 'Total Volume Traded DE-CH',
+                   'CH-DE Revenue Max', 'CH-DE Revenue Min', 'DE-CH Revenue Max', 'DE-CH Revenue Min',
+                   'Number of Contracts Closed', 'CH-DE Additional Contracts Closed', 'DE-CH Additional Contracts Closed']
+
+
+def derive_day_windows(task):
+
+    # the day is parsed once, or read from its lead time bins, and its transactions derived for every lead window of the sweep
+    opath, day, lead_windows, cache, lead_bins_folder = task
+
+    if lead_bins_folder is None:
+        df = read_epex_file(opath, cache=cache)
+
+    transactions = {}
+    for lead_window in lead_windows:
+
+        if lead_bins_folder is None:
+            df_filtered, unbounded_contract = filter_lead_time(
+                df, lead_window=lead_window)
+        else:
+            df_filtered, unbounded_contract = read_lead_window(
+                lead_bins_folder, day, lead_window)
+
+        # windows without executed orders leave the day out of the scenario
+        if df_filtered.shape[0] == 0:
+            transactions[lead_window] = None
+            continue
+
+        pivoted, pivoted_levels = extract_transactions(
+            df_filtered, unbounded_contract=unbounded_contract, engine='sort_merge')
+        transactions[lead_window] = clean_transactions(pivoted_levels)
+
+    return transactions
+
+
+def run_scenario(task):
+
+    # the capacity state of a scenario is carried from day to day as in the sequential pipeline
+    lead_window, pumping_threshold, days, transactions, NTC, wp, power_lim = task
+
+    ledger = CapacityLedger(NTC, power_lim)
+
+    df_list = []
+    for day, pivoted_levels in zip(days, transactions):
+
+        if pivoted_levels is None or pivoted_levels.shape[0] == 0:
+            continue
+
+        pivoted_levels_updated = match_transactions_both_sides(
+            pivoted_levels, NTC, wp, power_lim, ledger=ledger, kernel=True, pumping_threshold=pumping_threshold)
+        df_list.append(pivoted_levels_updated.assign(day=day))
+
+    # a scenario without any transaction on any day has no daily rows
+    if not df_list:
+        return None
+
+    df_summary = daily_summary(pd.concat(df_list, ignore_index=True))
+
+    df_summary.insert(0, 'pumping_threshold', pumping_threshold)
+    df_summary.insert(1, 'lead_time_min', lead_window[0])
+    df_summary.insert(2, 'lead_time_max', lead_window[1])
+
+    return df_summary
+
+
+def scenario_sweep(folder_root_path='../data/external/EPEX_spot_continous_2019', pumping_thresholds=(0.7,), lead_windows=((30, 60),),
+                   workers=1, use_cache=True, cache_folder='../data/interim/EPEX_cache', lead_bins_folder=None):
+    """
+    This function evaluates a grid of pumping thresholds and lead time windows in one run: every day is parsed
+    once, its transactions are derived once per lead window and then matched for every pumping threshold
+
+    Args:
+        folder_root_path: folder containing the monthly EPEX LOB folders (string)
+        pumping_thresholds: shares of the weekly price below which contracts can be matched for pumping (list)
+        lead_windows: minimum and maximum lead time in minutes of each window (list)
+        workers: number of worker processes for the derivation of the days and for the scenarios (int)
+        use_cache: deciding whether to consult the on-disk cache of parsed EPEX days (bool)
+        cache_folder: folder of the on-disk cache of parsed EPEX days (string)
+        lead_bins_folder: interim folder of a pipeline run written with lead time bins, whose bins are read
+            instead of parsing the EPEX days (string)
+    Return:
+        df_scenarios: totals of the daily summary per scenario (Pandas DataFrame)
+
+    """
+
+    tic = time.time()
+
+    cache = EpexCache(
+        cache_folder) if use_cache and lead_bins_folder is None else None
+
+    # load static data
+    wp = WeeklyPrices(read_weekly_prices_file(
+        "../data/external/Hydro Generation and Price_CH_2019.csv"))
+    NTC = NTC_preparation(read_NTC_file(
+        "../data/external/NTC_DEandCH_2019.csv"))
+    power_lim = pw_preparation(read_pw_file(
+        "../data/external/Hydro Generation up- downscale Potential_CH_2019.csv"))
+
+    # order the path correctly in time
+    if lead_bins_folder is None:
+        paths = glob.glob(folder_root_path+'/*/DE *.csv')
+        ordered_paths = sorted(
+            paths, key=lambda filepath: pd.Timestamp(filepath.split('/')[-1].split('.')[0][-8:]))
+        days = [pd.Timestamp(opath.split('/')[-1].split('.')[0][-8:])
+                for opath in ordered_paths]
+    else:
+        days = lead_time_bin_days(lead_bins_folder)
+        ordered_paths = [day_file_name(day) for day in days]
+
+    print(
+        f'\n {len(pumping_thresholds)*len(lead_windows)} scenarios over the days from the {days[0]} to the {days[-1]}')
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+
+        # transactions of every day for every lead window
+        day_transactions = list(tqdm(executor.map(derive_day_windows, [(opath, day, lead_windows, cache, lead_bins_folder)
+                                                                           for opath, day in zip(ordered_paths, days)]),
+                                     total=len(ordered_paths)))
+
+        tasks = [(lead_window, pumping_threshold, days, [transactions[lead_window] for transactions in day_transactions], NTC, wp, power_lim)
+                 for lead_window, pumping_threshold in product(lead_windows, pumping_thresholds)]
+        df_summaries = [df_summary for df_summary in tqdm(executor.map(run_scenario, tasks), total=len(tasks))
+                        if df_summary is not None]
+
+    scenario = ['pumping_threshold', 'lead_time_min', 'lead_time_max']
+    if df_summaries:
+        df_daily = pd.concat(df_summaries, ignore_index=True)
+    else:
+        # no scenario has any transaction, the totals keep the dtypes of the daily summary
+        df_daily = pd.DataFrame(columns=scenario+['time']+SCENARIO_TOTALS).astype(
+            {col: 'int64' if 'Contracts' in col else 'float64' for col in SCENARIO_TOTALS})
+
+    # save the daily summary and the totals of every scenario
+    base_processed_folder = pathlib.Path(
+        r'../data/processed') / f'scenario_sweep_{datetime.now().strftime("%d-%m-%Y %H_%M_%S")}'
+    os.makedirs(base_processed_folder)
+
+    df_daily.to_csv(base_processed_folder /
+                    'scenario_daily_summary.csv', index=False)
+
+    # every scenario of the grid is reported, with zero totals and days when it has no transactions
+    scenarios = pd.MultiIndex.from_tuples([(pumping_threshold, lead_window[0], lead_window[1]) for lead_window, pumping_threshold
+                                           in product(lead_windows, pumping_thresholds)], names=scenario).sort_values()
+    df_scenarios = df_daily.groupby(scenario)[SCENARIO_TOTALS].sum().reindex(
+        scenarios, fill_value=0)
+    df_scenarios['Days'] = df_daily.groupby(
+        scenario).size().reindex(scenarios, fill_value=0)
+    df_scenarios.to_csv(base_processed_folder / 'scenario_summary.csv')
+
+    toc = time.time()
+    print(
+        f'\n Sweeping the scenarios takes {toc-tic} seconds, results saved in {base_processed_folder}')
+
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print('\n', df_scenarios)
+
+    return df_scenarios
+
+
+def lead_window_arg(value):
+
+    # lead windows are given as MIN-MAX in minutes
+    try:
+        lead_min, lead_max = (int(x) for x in value.split('-'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f'{value} is not a lead window MIN-MAX in minutes')
+
+    return lead_min, lead_max
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Evaluate a grid of pumping thresholds and lead time windows reusing the parsed EPEX days')
+    parser.add_argument('--folder-root-path', default='../data/external/EPEX_spot_continous_2019',
+                        help='folder containing the monthly EPEX LOB folders')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.7],
+                        help='pumping thresholds as shares of the weekly price')
+    parser.add_argument('--lead-windows', type=lead_window_arg, nargs='+', default=[(30, 60)],
+                        help='lead time windows as MIN-MAX in minutes, e.g. 30-60')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of worker processes')
+    parser.add_argument('--cache-folder', default='../data/interim/EPEX_cache',
+                        help='folder of the on-disk cache of parsed EPEX days')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always parse the raw csv files without consulting the cache')
+    parser.add_argument('--lead-bins-folder', default=None,
+                        help='interim folder of a pipeline run with --lead-time-bins, its bins are read instead of the EPEX days')
+    args = parser.parse_args()
+
+    scenario_sweep(folder_root_path=args.folder_root_path,
+                   pumping_thresholds=args.thresholds,
+                   lead_windows=args.lead_windows,
+                   workers=args.workers,
+                   use_cache=not args.no_cache,
+                   cache_folder=args.cache_folder,
+                   lead_bins_folder=args.lead_bins_folder)
@@ -0,0 +1,85 @@
+import argparse
+import glob
+import time
+from tqdm import tqdm
+import numpy as np
+import pandas as pd
+
+from src.data.matching_kernel import numba
+from src.data.welfare_complete import clean_transactions, read_weekly_prices_file, read_NTC_file, NTC_preparation, match_transactions_both_sides, read_pw_file, pw_preparation, CapacityLedger
+
+
+def load_static_data():
+
+    wp = read_weekly_prices_file(
+        "../data/external/Hydro Generation and Price_CH_2019.csv")
+    NTC = NTC_preparation(read_NTC_file(
+        "../data/external/NTC_DEandCH_2019.csv"))
+    power_lim = pw_preparation(read_pw_file(
+        "../data/external/Hydro Generation up- downscale Potential_CH_2019.csv"))
+
+    return wp, NTC, power_lim
+
+
+def read_recorded_transactions(path):
+
+    # daily inputs of the welfare model as recorded by the complete pipeline
+    df = pd.read_csv(path)
+    for col in ['End Validity Date_B', 'End Validity Date_S', 'Delivery Start_B', 'Delivery Start_S']:
+        df[col] = pd.to_datetime(df[col], utc=True)
+
+    return clean_transactions(df)
+
+
+def validate_matching_kernel(folder_root_path):
+
+    print(
+        f'\n Comparing the {"numba" if numba is not None else "NumPy"} matching kernel with the row by row welfare model')
+
+    paths = sorted(glob.glob(folder_root_path+'/*/Transactions/*.csv'))
+
+    # the two implementations run on their own copy of the capacity state, carried over the days
+    wp, NTC, power_lim = load_static_data()
+    _, NTC_kernel, power_lim_kernel = load_static_data()
+    ledger = CapacityLedger(NTC_kernel, power_lim_kernel)
+
+    time_pandas = 0
+    time_kernel = 0
+    for opath in tqdm(paths):
+
+        pivoted_levels = read_recorded_transactions(opath)
+
+        tic = time.time()
+        expected = match_transactions_both_sides(
+            pivoted_levels, NTC, wp, power_lim)
+        time_pandas += time.time()-tic
+
+        tic = time.time()
+        result = match_transactions_both_sides(
+            pivoted_levels, NTC_kernel, wp, power_lim_kernel, ledger=ledger, kernel=True)
+        time_kernel += time.time()-tic
+
+        pd.testing.assert_frame_equal(expected, result, check_dtype=False)
+
+    # the capacity left at the end of the run must be the same as well
+    ledger.update_frames(NTC_kernel, power_lim_kernel)
+    for df, df_kernel, cols in [(NTC, NTC_kernel, ['CH to DE_Actual value (MW) update', 'DE to CH_Actual value (MW) update']),
+                                (power_lim, power_lim_kernel, ['Selling Actual value update [MW]', 'Pumping Actual value update [MW]'])]:
+        for col in cols:
+            np.testing.assert_array_equal(df[col].to_numpy(
+                dtype=float), df_kernel[col].to_numpy(dtype=float))
+
+    print(f'\n {len(paths)} days give identical outcomes, prices and capacities')
+    print(
+        f'\n Row by row welfare model takes {time_pandas} seconds, matching kernel takes {time_kernel} seconds')
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Check the matching kernel against the row by row welfare model on recorded daily transactions')
+    parser.add_argument('folder_root_path',
+                        help='interim folder of a complete pipeline run')
+    args = parser.parse_args()
+
+    validate_matching_kernel(args.folder_root_path)
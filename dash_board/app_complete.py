@@ -18,7 +18,9 @@ import copy
 
 # import helper functions
 from src.visualization.visualize_transactions_complete import executed_transactions_heatmap_summary, executed_transactions_time_series_dashboard
-from src.data.welfare_complete import read_NTC_file, NTC_preparation, read_pw_file, pw_preparation
+from src.data.welfare_complete import load_static_data
+from src.data.processed_dataset import read_day
+from src.data.day_cache import DayCache
 
 # Multi-dropdown options
 app = dash.Dash(__name__)
@@ -66,16 +68,16 @@ def format_thousands(number_string):
     return initial_+','.join(split_number)
 
 
-# load NTC
-NTC = read_NTC_file(pathlib.Path(
-    r"../data/external/NTC_DEandCH_2019.csv"))
-NTC = NTC_preparation(NTC)
+# pipeline run shown by the dashboard, either daily csv files or Parquet datasets
+processed_folder = pathlib.Path(
+    r'../data/processed/EPEX_spot_continous_complete_pipeline_2019_21-04-2021 21_54_04')
 
-# load power limit data
-power_lim = read_pw_file(
-    pathlib.Path(
-        r"../data/external/Hydro Generation up- downscale Potential_CH_2019.csv"))
-power_lim = pw_preparation(power_lim)
+# load NTC and power limit data, memory-mapped from the static data bundle when it is up to date
+static_paths = [pathlib.Path(r"../data/external/Hydro Generation and Price_CH_2019.csv"),
+                pathlib.Path(r"../data/external/NTC_DEandCH_2019.csv"),
+                pathlib.Path(r"../data/external/Hydro Generation up- downscale Potential_CH_2019.csv")]
+_, NTC, power_lim = load_static_data(static_paths, bundle_path=pathlib.Path(
+    r'../data/interim/static_data_2019.bundle'))
 
 # Create app layout
 app.layout = html.Div(
@@ -337,6 +339,93 @@ app.layout = html.Div(
 
 # Helper functions
 
+# process-wide cache of the day files and of their aggregates, shared by the callbacks of the date picker,
+# its hits, misses and evictions are printed after every load
+day_cache = DayCache(max_megabytes=512, log_misses=True)
+
+
+def day_transactions(date_object):
+
+    # load and read corresponding file, once for all the callbacks of the date
+    return day_cache.get(('transactions', date_object), lambda: read_day(
+        processed_folder, date_object, stage='Updated Transactions'))
+
+
+def hourly_used_capacity(date_object):
+
+    def load():
+
+        d_hours_CH_DE = dict(zip(range(24), [0]*24))
+        d_hours_DE_CH = dict(zip(range(24), [0]*24))
+
+        df_transactions = day_transactions(date_object)
+
+        mask = df_transactions['match_binary_outcome_selling'] == 1
+        df_transactions_filtered = df_transactions[mask]
+        times_tr = pd.to_datetime(df_transactions_filtered['Delivery Start'])
+        gb_ch_de = df_transactions_filtered.groupby(times_tr.dt.hour)[
+            'Executed Volume']
+
+        mask = df_transactions['match_binary_outcome_pumping'] == 1
+        df_transactions_filtered = df_transactions[mask]
+        times_tr = pd.to_datetime(df_transactions_filtered['Delivery Start'])
+        gb_de_ch = df_transactions_filtered.groupby(times_tr.dt.hour)[
+            'Executed Volume']
+
+        d_hours_new_CH_DE = dict(
+            zip(list(gb_ch_de.groups.keys()), gb_ch_de.sum()))
+        d_hours_CH_DE.update(d_hours_new_CH_DE)
+
+        d_hours_new_DE_CH = dict(
+            zip(list(gb_de_ch.groups.keys()), gb_de_ch.sum()))
+        d_hours_DE_CH.update(d_hours_new_DE_CH)
+
+        return d_hours_CH_DE, d_hours_DE_CH
+
+    return day_cache.get(('hourly used capacity', date_object), load)
+
+
+def heatmap_price_change(date_object):
+
+    def load():
+
+        # the summary adds columns to the transactions, the cached day is left untouched
+        daily_execution_price_stat, daily_execution_volume_stat, daily_execution_price_stat_marginal = executed_transactions_heatmap_summary(
+            day_transactions(date_object).copy(), plot=False, return_updated_transactions=True)
+
+        return (daily_execution_price_stat_marginal -
+                daily_execution_price_stat)/daily_execution_price_stat
+
+    return day_cache.get(('heatmap', date_object), load)
+
+
+def price_time_series(date_object, which_effect, smoothing):
+
+    def load():
+
+        df_transactions = day_transactions(date_object).copy()
+        if smoothing:
+            time, output = executed_transactions_time_series_dashboard(
+                df_transactions, which_effect=which_effect)
+
+            outputseries = [0, 0]
+            df_plotting = pd.DataFrame(
+                data={'time': time, 'values': output[0]})
+            outputseries[0] = df_plotting.set_index(
+                'time')['values'].rolling('1H').mean()
+
+            df_plotting = pd.DataFrame(
+                data={'time': time, 'values': output[1]})
+            outputseries[1] = df_plotting.set_index(
+                'time')['values'].rolling('1H').mean()
+        else:
+            time, outputseries = executed_transactions_time_series_dashboard(
+                df_transactions, which_effect=which_effect)
+
+        return time, outputseries
+
+    return day_cache.get(('price time series', date_object, which_effect, bool(smoothing)), load)
+
 
 # Create callbacks
 @app.callback(
@@ -346,17 +435,7 @@ def update_pieplot(date_value):
 
     if date_value is not None:
         date_object = date.fromisoformat(date_value)
-        month = str(date_object.month) if len(
-            str(date_object.month)) > 1 else '0'+str(date_object.month)
-
-        day = str(date_object.day) if len(
-            str(date_object.day)) > 1 else '0'+str(date_object.day)
-
-        # load and read corresponding file
-        df_transactions = pd.read_csv(
-            pathlib.Path(
-                f'../data/processed/EPEX_spot_continous_complete_pipeline_2019_21-04-2021 21_54_04/2019-{month}/Updated Transactions/DE_2019{month}{day}.csv')
-        )
+        df_transactions = day_transactions(date_object)
 
         data = [dict(
             type='pie',
@@ -386,19 +465,10 @@ def update_net_transfer_capacity(date_value):
 
     if date_value is not None:
 
-        d_hours_CH_DE = dict(zip(range(24), [0]*24))
-        d_hours_DE_CH = dict(zip(range(24), [0]*24))
-
         date_object = date.fromisoformat(date_value)
         NTC_selection = NTC[(NTC['start_time'].dt.day == date_object.day) & (
             NTC['start_time'].dt.month == date_object.month)]
 
-        month = str(date_object.month) if len(
-            str(date_object.month)) > 1 else '0'+str(date_object.month)
-
-        day = str(date_object.day) if len(
-            str(date_object.day)) > 1 else '0'+str(date_object.day)
-
         times_ntc = NTC_selection['start_time']
 
         # available transfer capacity
@@ -410,40 +480,13 @@ def update_net_transfer_capacity(date_value):
         # power limits
         power_lim_selection = power_lim[(power_lim['start_time'].dt.day == date_object.day) & (
             power_lim['start_time'].dt.month == date_object.month)]
-        power_lim_selection['Upscale Potential [MW]'] = power_lim_selection['Upscale Potential [MW]'].astype(
-            'float')
-        power_lim_selection['Donwnscale Potential [MW]'] = power_lim_selection['Donwnscale Potential [MW]'].astype(
-            'float')
         upscale_gb = power_lim_selection.groupby(power_lim_selection['start_time'].dt.hour)[
             'Upscale Potential [MW]']
         downscale_gb = power_lim_selection.groupby(power_lim_selection['start_time'].dt.hour)[
             'Donwnscale Potential [MW]']
 
-        # load and read corresponding file
-        df_transactions = pd.read_csv(
-            pathlib.Path(
-                f'../data/processed/EPEX_spot_continous_complete_pipeline_2019_21-04-2021 21_54_04/2019-{month}/Updated Transactions/DE_2019{month}{day}.csv')
-        )
-
-        mask = df_transactions['match_binary_outcome_selling'] == 1
-        df_transactions_filtered = df_transactions[mask]
-        times_tr = pd.to_datetime(df_transactions_filtered['Delivery Start'])
-        gb_ch_de = df_transactions_filtered.groupby(times_tr.dt.hour)[
-            'Executed Volume']
-
-        mask = df_transactions['match_binary_outcome_pumping'] == 1
-        df_transactions_filtered = df_transactions[mask]
-        times_tr = pd.to_datetime(df_transactions_filtered['Delivery Start'])
-        gb_de_ch = df_transactions_filtered.groupby(times_tr.dt.hour)[
-            'Executed Volume']
-
-        d_hours_new_CH_DE = dict(
-            zip(list(gb_ch_de.groups.keys()), gb_ch_de.sum()))
-        d_hours_CH_DE.update(d_hours_new_CH_DE)
-
-        d_hours_new_DE_CH = dict(
-            zip(list(gb_de_ch.groups.keys()), gb_de_ch.sum()))
-        d_hours_DE_CH.update(d_hours_new_DE_CH)
+        # used transfer capacity
+        d_hours_CH_DE, d_hours_DE_CH = hourly_used_capacity(date_object)
 
         figure = go.Figure(data=[go.Bar(name='CH-DE Used Available Transfer Capacity MW',
                                         x=list(d_hours_CH_DE.keys()),
@@ -476,23 +519,7 @@ def update_hetamap(date_value):
 
     if date_value is not None:
         date_object = date.fromisoformat(date_value)
-        month = str(date_object.month) if len(
-            str(date_object.month)) > 1 else '0'+str(date_object.month)
-
-        day = str(date_object.day) if len(
-            str(date_object.day)) > 1 else '0'+str(date_object.day)
-
-        # load and read corresponding file
-        df_transactions = pd.read_csv(
-            pathlib.Path(
-                f'../data/processed/EPEX_spot_continous_complete_pipeline_2019_21-04-2021 21_54_04/2019-{month}/Updated Transactions/DE_2019{month}{day}.csv')
-        )
-
-        daily_execution_price_stat, daily_execution_volume_stat, daily_execution_price_stat_marginal = executed_transactions_heatmap_summary(
-            df_transactions, plot=False, return_updated_transactions=True)
-
-        df_plot = (daily_execution_price_stat_marginal -
-                   daily_execution_price_stat)/daily_execution_price_stat
+        df_plot = heatmap_price_change(date_object)
 
         figure = go.Figure(data=go.Heatmap(df_to_plotly(df_plot),
                                            hovertemplate='Max ΔPrice wrt History: %{z:.2%}<br>Statistic: %{x}<br>Hour: %{y}<extra></extra>',
@@ -514,34 +541,8 @@ def update_output_table(date_value, which_effect, smoothing):
 
     if date_value is not None:
         date_object = date.fromisoformat(date_value)
-        month = str(date_object.month) if len(
-            str(date_object.month)) > 1 else '0'+str(date_object.month)
-
-        day = str(date_object.day) if len(
-            str(date_object.day)) > 1 else '0'+str(date_object.day)
-
-        # load and read corresponding file
-        df_transactions = pd.read_csv(
-            pathlib.Path(
-                f'../data/processed/EPEX_spot_continous_complete_pipeline_2019_21-04-2021 21_54_04/2019-{month}/Updated Transactions/DE_2019{month}{day}.csv')
-        )
-        if smoothing:
-            time, output = executed_transactions_time_series_dashboard(
-                df_transactions, which_effect=which_effect)
-
-            outputseries = [0, 0]
-            df_plotting = pd.DataFrame(
-                data={'time': time, 'values': output[0]})
-            outputseries[0] = df_plotting.set_index(
-                'time')['values'].rolling('1H').mean()
-
-            df_plotting = pd.DataFrame(
-                data={'time': time, 'values': output[1]})
-            outputseries[1] = df_plotting.set_index(
-                'time')['values'].rolling('1H').mean()
-        else:
-            time, outputseries = executed_transactions_time_series_dashboard(
-                df_transactions, which_effect=which_effect)
+        time, outputseries = price_time_series(
+            date_object, which_effect, smoothing)
 
         data = [
             dict(
@@ -0,0 +1,142 @@
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+import pandas as pd
+
+
+def estimate_nbytes(value):
+    """
+    This function estimates the memory held by a cached value, dataframes and arrays being counted with their content
+
+    Args:
+        value: cached value, a dataframe, array or container of them (object)
+    Return:
+        nbytes: estimated size in bytes (int)
+
+    """
+
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_nbytes(x) for x in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(x) for x in value)
+
+    return sys.getsizeof(value)
+
+
+class DayCache:
+    """
+    Process-wide least recently used cache of the daily frames and of the aggregates derived from them. Entries
+    are evicted, least recently used first, as soon as their estimated memory exceeds the budget. The lock only
+    guards the entries, values are loaded outside of it: callers asking for a value being loaded wait for that
+    single load, while the other keys keep being served
+
+    Cached values are shared between the callers and must not be modified in place
+
+    Args:
+        max_megabytes: memory budget of the cached values (float)
+        max_entries: maximum number of cached values, no limit when None (int)
+        log_misses: deciding whether to print the counters of the cache after every load (bool)
+
+    """
+
+    def __init__(self, max_megabytes=512, max_entries=None, log_misses=False):
+
+        self.max_bytes = int(max_megabytes*2**20)
+        self.max_entries = max_entries
+        self.log_misses = log_misses
+        self.entries = OrderedDict()
+        self.loading = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, loader):
+        """
+        This function returns the cached value of the key, calling the loader on a cache miss
+
+        Args:
+            key: hashable identifier of the value, e.g. the kind of value and the delivery day (tuple)
+            loader: function without arguments computing the value (function)
+        Return:
+            value: cached or freshly loaded value (object)
+
+        """
+
+        with self.lock:
+
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+
+            # a value being loaded by another caller is a hit once the load is done
+            future = self.loading.get(key)
+            loader_call = future is None
+            if loader_call:
+                future = self.loading[key] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if not loader_call:
+            return future.result()
+
+        try:
+            value = loader()
+        except BaseException as error:
+            # the callers waiting for the load get its error, the next call loads again
+            with self.lock:
+                del self.loading[key]
+            future.set_exception(error)
+            raise
+
+        # the memory of the value is estimated before taking the lock
+        nbytes = estimate_nbytes(value)
+        with self.lock:
+            self.store(key, value, nbytes)
+            del self.loading[key]
+        future.set_result(value)
+
+        if self.log_misses:
+            self.report()
+
+        return value
+
+    def store(self, key, value, nbytes):
+
+        # called with the lock held
+        self.entries[key] = (value, nbytes)
+        self.nbytes += nbytes
+
+        # the newest value is kept even when it exceeds the budget on its own
+        while len(self.entries) > 1 and (self.nbytes > self.max_bytes or
+                                         (self.max_entries is not None and len(self.entries) > self.max_entries)):
+            _, (_, evicted_nbytes) = self.entries.popitem(last=False)
+            self.nbytes -= evicted_nbytes
+            self.evictions += 1
+
+    def clear(self):
+
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+
+        with self.lock:
+            return {'entries': len(self.entries), 'megabytes': self.nbytes/2**20,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def report(self):
+
+        stats = self.stats()
+        print(
+            f'\n Day cache: {stats["entries"]} entries of {stats["megabytes"]:.1f} MB, {stats["hits"]} hits, {stats["misses"]} misses, {stats["evictions"]} evictions')
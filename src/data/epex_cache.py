@@ -0,0 +1,93 @@
+import glob
+import hashlib
+import os
+import pathlib
+import pandas as pd
+
+from src.data.helper_closed_transactions import EPEX_PARSER_VERSION
+
+
+class EpexCache:
+    """
+    On-disk Feather cache of parsed EPEX LOB days. Every entry is keyed by the source path, its size, its
+    modification time and the parser version, so a changed raw file or a new parser invalidates the entry
+
+    Args:
+        cache_folder: folder where the parsed days are stored (string or pathlib.Path)
+        rebuild: deciding whether to ignore the existing entries and parse every file again (bool)
+
+    """
+
+    def __init__(self, cache_folder='../data/interim/EPEX_cache', rebuild=False):
+
+        self.cache_folder = pathlib.Path(cache_folder)
+        self.rebuild = rebuild
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+        os.makedirs(self.cache_folder, exist_ok=True)
+
+    def source_id(self, path):
+        """Identifier of the raw file, independent from its content"""
+
+        return hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+
+    def key(self, path):
+        """Identifier of the raw file content as seen by the current parser"""
+
+        stat = os.stat(path)
+        key = f'{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{EPEX_PARSER_VERSION}'
+
+        return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+    def entry_path(self, path):
+
+        return self.cache_folder / f'{self.source_id(path)}_{self.key(path)}.feather'
+
+    def load(self, path):
+        """
+        This function returns the parsed day of the raw file if a valid entry exists
+
+        Args:
+            path: raw file location path (string)
+        Return:
+            df: parsed dataframe or None on a cache miss (Pandas DataFrame)
+
+        """
+
+        entry = self.entry_path(path)
+
+        if not self.rebuild and entry.is_file():
+            self.hits += 1
+            return pd.read_feather(entry)
+
+        self.misses += 1
+        return None
+
+    def store(self, path, df):
+        """
+        This function stores the parsed day of the raw file and removes the outdated entries of the same file
+
+        Args:
+            path: raw file location path (string)
+            df: parsed dataframe (Pandas DataFrame)
+
+        """
+
+        entry = self.entry_path(path)
+
+        for stale in glob.glob(str(self.cache_folder / f'{self.source_id(path)}_*.feather')):
+            if pathlib.Path(stale) != entry:
+                os.remove(stale)
+                self.invalidated += 1
+
+        # write to a temporary file first so that an interrupted run never leaves a truncated entry
+        tmp_entry = entry.with_suffix('.tmp')
+        df.to_feather(tmp_entry)
+        os.replace(tmp_entry, entry)
+
+    def report(self):
+
+        print(
+            f'\n EPEX cache in {self.cache_folder}: {self.hits} hits, {self.misses} misses, {self.invalidated} outdated entries removed')
@@ -1,8 +1,26 @@
+import numbers
 import pandas as pd
 import numpy as np
 import time
 
 
+# version of the parsed LOB layout returned by parse_epex_file, bump it whenever the parsing changes
+# so that the on-disk cache of parsed days is invalidated
+EPEX_PARSER_VERSION = 1
+
+# duration of each EPEX instrument type, any other instrument is a quarter hour
+INSTRUMENT_TYPE_DURATION = {'Hour': pd.Timedelta(1, unit='hours'),
+                            'Half Hour': pd.Timedelta(0.5, unit='hours'),
+                            'Quarter Hour': pd.Timedelta(0.25, unit='hours')}
+
+# instrument type of each duration in hours of the ALPIQ transactions, whose times are formatted as below
+DURATION_INSTRUMENT_TYPE = {0.25: 'Quarter Hour', 0.5: 'Half Hour', 1: 'Hour'}
+NEW_TRANSACTIONS_TIME_FORMAT = '%m/%d/%y %H:%M'
+
+# edges in minutes of the lead time bins of the lead time reduction studies
+LEAD_TIME_BINS = [0, 5, 15, 30, 60]
+
+
 def format_delta(instrument_type_duration, delivery_instrument):
     """
     This function takes the delivery instrument and reformat it to with the starting time
@@ -18,52 +36,86 @@ def format_delta(instrument_type_duration, delivery_instrument):
         return delivery_instrument-pd.Timedelta(0.25, unit='hours')
 
 
-def read_epex_file(path, fast_load=False, new_data_type=False):
+def format_delta_vectorized(instrument_type, delivery_instrument):
     """
-    This function takes the path of the old data frame type, reads it and loads it as a dataframe
+    This function is the column-wise version of format_delta: the instrument type is mapped to its duration
+    once and subtracted from the whole delivery instrument column
+
+    Args:
+        instrument_type: instrument type of each order (Pandas Series)
+        delivery_instrument: delivery instrument end time of each order (Pandas Series)
+    Return:
+        delivery_instrument_start: delivery instrument start time of each order (Pandas Series)
+
+    """
+
+    duration = pd.to_timedelta(instrument_type.map(INSTRUMENT_TYPE_DURATION)).fillna(
+        INSTRUMENT_TYPE_DURATION['Quarter Hour'])
+
+    return delivery_instrument-duration
+
+
+def read_epex_csv(path, fast_load=False, chunksize=None):
+    """
+    This function reads the raw csv of the old data frame type with the EPEX separators, decimals and dates
 
     Args:
         path: file location path (string)
-        new_data_type: defining whether the input is a new or old data file (bool)
         fast_load: deciding whether to load a minor section of the dataset [100000 rows] (bool)
+        chunksize: number of rows of each chunk, None to read the whole file at once (int)
     Returns:
-        df: read dataframe (Pandas DataFrame)
+        df: raw dataframe, or an iterator of raw dataframes with chunksize (Pandas DataFrame or TextFileReader)
 
     """
 
     # read first row only to get the columns name and avoid reading 'Unnamed: 17'
     cols = list(pd.read_csv(path, nrows=1, sep=';'))
 
-    df = pd.read_csv(path,
-                     sep=';',
-                     decimal=",",
-                     usecols=[i for i in cols if i !=
-                              'Unnamed: 17'],
-                     parse_dates=['Start Validity Date',
-                                  'End Validity Date', 'Cancelling Date'],
-                     date_parser=lambda col: pd.to_datetime(col,
-                                                            utc=True,
-                                                            format='%d/%m/%Y %H:%M:%S.%f',
-                                                            ),
-                     nrows=None if not fast_load else 100000
-                     )
+    return pd.read_csv(path,
+                       sep=';',
+                       decimal=",",
+                       usecols=[i for i in cols if i !=
+                                'Unnamed: 17'],
+                       parse_dates=['Start Validity Date',
+                                    'End Validity Date', 'Cancelling Date'],
+                       date_parser=lambda col: pd.to_datetime(col,
+                                                              utc=True,
+                                                              format='%d/%m/%Y %H:%M:%S.%f',
+                                                              ),
+                       nrows=None if not fast_load else 100000,
+                       chunksize=chunksize
+                       )
+
+
+def parse_epex_frame(df, vectorized=True):
+    """
+    This function parses the raw columns of the old data frame type into the delivery start and lead time
+
+    Args:
+        df: raw dataframe as read by read_epex_csv (Pandas DataFrame)
+        vectorized: deciding whether to compute the delivery start column-wise or row by row with format_delta (bool)
+    Returns:
+        df: parsed dataframe without the executed price and volume key (Pandas DataFrame)
+
+    """
 
     # change time data type
-    df['Delivery Instrument'] = pd.to_timedelta(
-        df['Delivery Instrument'].apply(lambda x: x + ':00'))
+    if vectorized:
+        df['Delivery Instrument'] = format_delta_vectorized(df['Instrument Type'],
+                                                            pd.to_timedelta(df['Delivery Instrument'] + ':00'))
+
+    else:
+        df['Delivery Instrument'] = pd.to_timedelta(
+            df['Delivery Instrument'].apply(lambda x: x + ':00'))
 
-    del_instument = df.apply(lambda x: format_delta(
-        x['Instrument Type'], x['Delivery Instrument']), axis=1)
+        del_instument = df.apply(lambda x: format_delta(
+            x['Instrument Type'], x['Delivery Instrument']), axis=1)
 
-    df['Delivery Instrument'] = del_instument
+        df['Delivery Instrument'] = del_instument
 
     df['Delivery Date'] = pd.to_datetime(
         df['Delivery Date'], utc=True, format='%d/%m/%Y')
 
-    # add column combination of execution volume, time and price which allows to combine the sell and buy transaction univocally
-    df['Executed Price & Volume'] = list(
-        zip(df['Execution Price'], df['Executed Volume']))
-
     # create delivery start column
     df['Delivery Start'] = df['Delivery Date'] + df['Delivery Instrument']
 
@@ -76,21 +128,74 @@ def read_epex_file(path, fast_load=False, new_data_type=False):
     return df
 
 
-def filter_lead_time(df):
+def parse_epex_file(path, fast_load=False, vectorized=True):
+    """
+    This function takes the path of the old data frame type, reads it and parses it into typed columns
+
+    Args:
+        path: file location path (string)
+        fast_load: deciding whether to load a minor section of the dataset [100000 rows] (bool)
+        vectorized: deciding whether to compute the delivery start column-wise or row by row with format_delta (bool)
+    Returns:
+        df: parsed dataframe without the executed price and volume key (Pandas DataFrame)
+
+    """
+
+    return parse_epex_frame(read_epex_csv(path, fast_load=fast_load), vectorized=vectorized)
+
+
+def read_epex_file(path, fast_load=False, new_data_type=False, vectorized=True, cache=None, legacy_key=False):
+    """
+    This function takes the path of the old data frame type, reads it and loads it as a dataframe
+
+    Args:
+        path: file location path (string)
+        new_data_type: defining whether the input is a new or old data file (bool)
+        fast_load: deciding whether to load a minor section of the dataset [100000 rows] (bool)
+        vectorized: deciding whether to compute the delivery start column-wise or row by row with format_delta (bool)
+        cache: on-disk cache of parsed days consulted before parsing the csv, ignored with fast_load (EpexCache)
+        legacy_key: deciding whether to add the 'Executed Price & Volume' tuple column of the former layout (bool)
+    Returns:
+        df: read dataframe (Pandas DataFrame)
+
+    """
+
+    if cache is not None and not fast_load:
+        df = cache.load(path)
+
+        if df is None:
+            df = parse_epex_file(path, vectorized=vectorized)
+            cache.store(path, df)
+
+    else:
+        df = parse_epex_file(path, fast_load=fast_load, vectorized=vectorized)
+
+    # the transactions are paired on numeric keys, the tuple column is only kept for the former file layout
+    if legacy_key:
+        df.insert(df.columns.get_loc('Delivery Start'), LEGACY_KEY, list(
+            zip(df['Execution Price'], df['Executed Volume'])))
+
+    return df
+
+
+def filter_lead_time(df, lead_window=(30, 60)):
     """
 
     This function filters the LOB dataframe for the orders with a lead time which is relevant for the investigation
 
     Args:
         df: LOB dataframe (Pandas DataFrame)
+        lead_window: minimum and maximum lead time in minutes, both included (tuple)
     Return:
         df_filtered: dataframe with filtered LOB (Pandas DataFrame)
+        unbounded_contract: whether the executed buy and sell volumes differ (bool)
 
     """
 
-    # define logical statement to filter rows based on lead time
-    logical_statement_lead_time = (df['lead_time'].dt.total_seconds(
-    )/60 >= 30) & (df['lead_time'].dt.total_seconds()/60 <= 60)
+    # define logical statement to filter rows based on lead time, converted to minutes once
+    lead_minutes = df['lead_time'].dt.total_seconds()/60
+    logical_statement_lead_time = (lead_minutes >= lead_window[0]) & (
+        lead_minutes <= lead_window[1])
 
     # filter the dataframe based on logical statement
     df_filtered = df[logical_statement_lead_time]
@@ -101,7 +206,104 @@ def filter_lead_time(df):
     # filter the dataframe based on logical statement
     df_filtered = df_filtered[logical_statement_execution]
 
-    # check for presence of unbound contracts
+    return df_filtered, check_unbounded_contract(df_filtered)
+
+
+def lead_time_bin_windows(bins=LEAD_TIME_BINS):
+
+    # consecutive edges of the bins, each bin holding its lower edge and the last one its upper edge too
+    return list(zip(bins[:-1], bins[1:]))
+
+
+def partition_lead_time(df, bins=LEAD_TIME_BINS):
+    """
+
+    This function buckets every executed order of the LOB dataframe into its lead time bin in a single pass
+
+    Args:
+        df: LOB dataframe (Pandas DataFrame)
+        bins: strictly increasing integer edges of the bins in minutes (list)
+    Return:
+        partitions: executed orders of each bin keyed by its (lower, upper) edges, in LOB order (dict)
+
+    """
+
+    # the edges name the partitions of the bins, which are read back as integer minutes
+    if len(bins) < 2 or not all(isinstance(edge, numbers.Integral) for edge in bins) or np.any(np.diff(bins) <= 0):
+        raise ValueError(
+            f'The lead time bins {list(bins)} are not at least two strictly increasing integer edges in minutes')
+
+    lead_minutes = (df['lead_time'].dt.total_seconds()/60).to_numpy()
+
+    # bin of every order, orders outside the edges or not executed in no bin
+    codes = np.searchsorted(bins, lead_minutes, side='right')-1
+    codes[lead_minutes == bins[-1]] = len(bins)-2
+    outside = np.isnan(lead_minutes) | (lead_minutes < bins[0]) | (
+        lead_minutes > bins[-1]) | (df['Is Executed'].to_numpy() == 0)
+    codes[outside] = -1
+
+    return {window: df[codes == code] for code, window in enumerate(lead_time_bin_windows(bins))}
+
+
+def lead_time_bins_in_window(windows, lead_window):
+    """
+
+    This function finds the lead time bins holding the orders of a lead time window
+
+    Args:
+        windows: (lower, upper) edges of the bins, as given by lead_time_bin_windows (list)
+        lead_window: minimum and maximum lead time in minutes, both included (tuple)
+    Return:
+        windows_in: edges of the bins overlapping the window (list)
+
+    """
+
+    windows = sorted(windows)
+    if lead_window[0] < windows[0][0] or lead_window[1] > windows[-1][1]:
+        raise ValueError(
+            f'The lead window {lead_window} is not covered by the lead time bins from {windows[0][0]} to {windows[-1][1]} minutes')
+
+    return [(lower, upper) for i, (lower, upper) in enumerate(windows)
+            if lower <= lead_window[1] and (upper > lead_window[0] or (i == len(windows)-1 and upper >= lead_window[0]))]
+
+
+def select_lead_window(partitions, lead_window):
+    """
+
+    This function derives the filtered LOB of a lead time window from the lead time bins, giving the same
+    orders as filter_lead_time on the whole LOB
+
+    Args:
+        partitions: executed orders of the bins overlapping the window keyed by their edges (dict)
+        lead_window: minimum and maximum lead time in minutes, both included (tuple)
+    Return:
+        df_filtered: dataframe with filtered LOB (Pandas DataFrame)
+        unbounded_contract: whether the executed buy and sell volumes differ (bool)
+
+    """
+
+    # the index of the orders keeps their position in the LOB
+    df = pd.concat([partitions[window] for window in lead_time_bins_in_window(
+        partitions, lead_window)]).sort_index(kind='mergesort')
+
+    lead_minutes = df['lead_time'].dt.total_seconds()/60
+    df_filtered = df[(lead_minutes >= lead_window[0])
+                     & (lead_minutes <= lead_window[1])]
+
+    return df_filtered, check_unbounded_contract(df_filtered)
+
+
+def check_unbounded_contract(df_filtered):
+    """
+
+    This function checks for presence of unbound contracts, where the executed buy and sell volumes differ
+
+    Args:
+        df_filtered: dataframe with filtered LOB (Pandas DataFrame)
+    Return:
+        unbounded_contract: whether the executed buy and sell volumes differ (bool)
+
+    """
 
     if df_filtered[df_filtered['Side'] == 'B']['Executed Volume'].sum() == df_filtered[df_filtered['Side'] == 'S']['Executed Volume'].sum():
         unbounded_contract = False
@@ -109,63 +311,305 @@ def filter_lead_time(df):
     else:
         unbounded_contract = True
 
-    return df_filtered, unbounded_contract
+    return unbounded_contract
+
+
+def common_chunk_dtype(dtypes, all_null):
+    """
+
+    This function finds the data type the whole file parser infers for a column read in chunks
+
+    Args:
+        dtypes: data type of the column in each chunk (list)
+        all_null: whether the column is empty in each chunk (list)
+    Return:
+        dtype: data type of the column in the whole file (numpy dtype)
+
+    """
+
+    # empty chunks are read as float or object whatever the column holds elsewhere
+    found = [dtype for dtype, null in zip(dtypes, all_null) if not null]
+    if not found:
+        return dtypes[0]
+
+    if all(dtype == found[0] for dtype in found):
+        dtype = found[0]
+    elif all(pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype) for dtype in found):
+        dtype = np.dtype('float64')
+    else:
+        dtype = np.dtype('O')
+
+    # missing values turn integer columns into float and boolean columns into object
+    if any(all_null):
+        if pd.api.types.is_integer_dtype(dtype):
+            dtype = np.dtype('float64')
+        elif pd.api.types.is_bool_dtype(dtype):
+            dtype = np.dtype('O')
+
+    return dtype
+
+
+def read_epex_file_filtered(path, chunksize=500000, lead_window=(30, 60), vectorized=True, legacy_key=False):
+    """
+
+    This function is the streaming version of read_epex_file followed by filter_lead_time: the csv is read in chunks
+    and only the executed orders in the lead time window are kept, so the memory is bounded by the chunk size
+
+    Args:
+        path: file location path (string)
+        chunksize: number of rows read and parsed at once (int)
+        lead_window: minimum and maximum lead time in minutes, both included (tuple)
+        vectorized: deciding whether to compute the delivery start column-wise or row by row with format_delta (bool)
+        legacy_key: deciding whether to add the 'Executed Price & Volume' tuple column of the former layout (bool)
+    Return:
+        df_filtered: dataframe with filtered LOB (Pandas DataFrame)
+        unbounded_contract: whether the executed buy and sell volumes differ (bool)
+
+    """
+
+    chunks = []
+    dtypes = []
+    all_null = []
+    for chunk in read_epex_csv(path, chunksize=chunksize):
+
+        # the chunks are numbered after the previous ones, as the rows of the whole file
+        chunk = parse_epex_frame(chunk, vectorized=vectorized)
+        chunk.index = chunk['index'].to_numpy()
+
+        dtypes.append(chunk.dtypes)
+        all_null.append(chunk.isna().all())
+
+        chunk_filtered, _ = filter_lead_time(chunk, lead_window=lead_window)
+        chunks.append(chunk_filtered)
+
+    df_filtered = pd.concat(chunks)
+
+    # same data types of the whole file, which are only known once every chunk is read
+    df_filtered = df_filtered.astype({col: common_chunk_dtype([dtype[col] for dtype in dtypes], [null[col] for null in all_null])
+                                      for col in df_filtered.columns})
+
+    if legacy_key:
+        df_filtered.insert(df_filtered.columns.get_loc('Delivery Start'), LEGACY_KEY, list(
+            zip(df_filtered['Execution Price'], df_filtered['Executed Volume'])))
+
+    return df_filtered, check_unbounded_contract(df_filtered)
+
+
+# LOB columns carried by every buy and sell side of a transaction
+TRANSACTION_VALUES = ['Price', 'Volume', 'Initial ID', 'Order ID', 'Parent ID', 'Is block',
+                      'Is Executed', 'Execution Price', 'Executed Volume', 'lead_time', 'Instrument Type', 'index']
+
+# keys univocally identifying the two sides of a transaction, price and volume keys sort as the former tuple key
+TRANSACTION_KEYS = ['End Validity Date', 'Execution Price Key',
+                    'Executed Volume Key', 'Delivery Start', 'Side']
+
+# tuple column of execution price and volume used as key by the former file layout
+LEGACY_KEY = 'Executed Price & Volume'
 
 
-def extract_transactions(df_filtered, unbounded_contract=False):
+def add_transaction_keys(df_filtered):
+    """
+
+    This function adds the numeric price and volume keys combining the sell and buy orders of a transaction
+
+    Args:
+        df_filtered: filtered LOB dataframe (Pandas DataFrame)
+    Return:
+        df_keys: filtered LOB dataframe with the float64 key columns (Pandas DataFrame)
+    """
+
+    return df_filtered.assign(**{'Execution Price Key': df_filtered['Execution Price'].astype('float64'),
+                                 'Executed Volume Key': df_filtered['Executed Volume'].astype('float64')})
+
+
+def pair_transactions(pivoted, legacy_key=False):
+    """
+
+    This function pairs the n-th buy order with the n-th sell order of the sorted pivoted table
+
+    Args:
+        pivoted: pivoted table showing transactions for confy visualization (Pandas DataFrame)
+        legacy_key: deciding whether to write the 'Executed Price & Volume' tuple columns of the former layout (bool)
+    Return:
+        pivoted_levels: pivoted table showing transactions for further analysis (Pandas DataFrame)
+    """
+
+    side = pivoted.index.get_level_values('Side')
+    pivoted_levels = pd.merge(pivoted[side == 'B'].reset_index(level='Side', drop=True).reset_index(),
+                              pivoted[side == 'S'].reset_index(
+        level='Side', drop=True).reset_index(),
+        left_index=True,
+        right_index=True,
+        suffixes=('_B', '_S'))
+
+    # the keys repeat the execution price and executed volume columns
+    for suffix in ['_B', '_S']:
+        if legacy_key:
+            pivoted_levels.insert(pivoted_levels.columns.get_loc('Execution Price Key'+suffix), LEGACY_KEY+suffix, list(
+                zip(pivoted_levels['Execution Price Key'+suffix], pivoted_levels['Executed Volume Key'+suffix])))
+        pivoted_levels = pivoted_levels.drop(
+            columns=['Execution Price Key'+suffix, 'Executed Volume Key'+suffix])
+
+    return pivoted_levels
+
+
+def find_problematic_dates(pivoted):
+    """
+
+    This function finds the end validity dates whose buy and sell orders cannot be paired, counting the orders
+    of each side per date in a single crosstab
+
+    Args:
+        pivoted: pivoted table showing transactions for confy visualization (Pandas DataFrame)
+    Return:
+        problematic: end validity dates with a single side or a different number of buy and sell orders (Pandas Index)
+    """
+
+    counts = pd.crosstab(pivoted.index.get_level_values('End Validity Date'),
+                         pivoted.index.get_level_values('Side'))
+
+    # a date is problematic when the two sides differ or when orders of any other side are present
+    unbalanced = counts.get('B', 0) != counts.get('S', 0)
+    other_side = counts.drop(
+        columns=['B', 'S'], errors='ignore').sum(axis=1) > 0
+
+    return counts.index[unbalanced | other_side]
+
+
+def dropped_trades_report(pivoted, problematic):
+    """
+
+    This function summarizes the orders dropped because of problematic end validity dates per delivery hour
+
+    Args:
+        pivoted: pivoted table before dropping the problematic dates (Pandas DataFrame)
+        problematic: end validity dates to be dropped (list or Pandas Index)
+    Return:
+        report: number of dropped buy and sell orders and dropped executed volume per delivery hour (Pandas DataFrame)
+    """
+
+    dropped = pivoted[pivoted.index.get_level_values(
+        'End Validity Date').isin(problematic)]
+    hours = pd.Index(dropped.index.get_level_values(
+        'Delivery Start').hour, name='Delivery Hour')
+    sides = dropped.index.get_level_values('Side')
+
+    report = pd.DataFrame(index=pd.RangeIndex(24, name='Delivery Hour'))
+    report['Dropped Buy Orders'] = pd.Series(
+        sides == 'B', index=hours).groupby(level=0).sum()
+    report['Dropped Sell Orders'] = pd.Series(
+        sides == 'S', index=hours).groupby(level=0).sum()
+    report['Dropped Executed Volume'] = pd.Series(
+        dropped['Executed Volume'].values.astype(float), index=hours).groupby(level=0).sum()
+
+    return report.fillna(0).astype({'Dropped Buy Orders': int, 'Dropped Sell Orders': int})
+
+
+def extract_transactions(df_filtered, unbounded_contract=False, engine='pivot', return_dropped=False, legacy_key=False):
     """
 
     This function filters extract the completed transactions from the filtered LOB dataframe
 
     Args:
         df_filtered: filtered LOB dataframe (Pandas DataFrame)
+        unbounded_contract: whether the buy and sell volumes differ and problematic dates must be dropped (bool)
+        engine: 'pivot' for the pivot table derivation or 'sort_merge' for the sorted keys derivation (string)
+        return_dropped: deciding whether to return the report of the dropped orders per delivery hour as well (bool)
+        legacy_key: deciding whether to write the 'Executed Price & Volume' tuple columns of the former layout (bool)
     Return:
         pivoted: pivoted table showing transactions for confy visualization (Pandas DataFrame)
         pivoted_levels: pivoted table showing transactions for further analysis (Pandas DataFrame)
+        dropped: orders dropped per delivery hour, only with return_dropped (Pandas DataFrame)
     """
 
+    if engine == 'sort_merge':
+        return extract_transactions_sort_merge(df_filtered, unbounded_contract=unbounded_contract, return_dropped=return_dropped, legacy_key=legacy_key)
+
     # table view with transactions buy and sell side showing row wise
-    pivoted = pd.pivot_table(df_filtered,
-                             values=['Price', 'Volume', 'Initial ID', 'Order ID', 'Parent ID', 'Is block',
-                                     'Is Executed', 'Execution Price', 'Executed Volume', 'lead_time', 'Instrument Type', 'index'],
-                             index=['End Validity Date',
-                                    'Executed Price & Volume', 'Delivery Start', 'Side'],
+    pivoted = pd.pivot_table(add_transaction_keys(df_filtered),
+                             values=TRANSACTION_VALUES,
+                             index=TRANSACTION_KEYS,
                              aggfunc=list,
                              ).apply(pd.Series.explode).sort_index()
-    if unbounded_contract:
 
-        problematic = []
-        for ind, v in pivoted.groupby(level=0):
-            d = dict(v.reset_index()['Side'].value_counts())
-            s = set(v.reset_index()['Side'].values)
+    problematic = find_problematic_dates(
+        pivoted) if unbounded_contract else []
+    if return_dropped:
+        dropped = dropped_trades_report(pivoted, problematic)
 
-            if s != set(['B', 'S']):
-                problematic.append(ind)
-            elif d['B']-d['S'] != 0:
-                problematic.append(ind)
+    if unbounded_contract:
         pivoted = pivoted[~pivoted.index.get_level_values(
             'End Validity Date').isin(problematic)]
 
     # table view with transactions indexed only for datetime and execution price adn volumes
-    pivoted_levels = pd.merge(pivoted.query('Side == "B"').reset_index(level=3, drop=True).reset_index(),
-                              pivoted.query('Side == "S"').reset_index(
-        level=3, drop=True).reset_index(),
-        left_index=True,
-        right_index=True,
-        suffixes=('_B', '_S'))
+    pivoted_levels = pair_transactions(pivoted, legacy_key=legacy_key)
+
+    if return_dropped:
+        return pivoted, pivoted_levels, dropped
 
     return pivoted, pivoted_levels
 
 
-def prepare_new_transactions(path):
+def extract_transactions_sort_merge(df_filtered, unbounded_contract=False, return_dropped=False, legacy_key=False):
+    """
+
+    This function derives the same transactions of the pivot table engine without building per group lists:
+    the executed orders are stably sorted on numeric keys and the buy and sell sides are merged in sorted order
+
+    Args:
+        df_filtered: filtered LOB dataframe (Pandas DataFrame)
+        unbounded_contract: whether the buy and sell volumes differ and problematic dates must be dropped (bool)
+        return_dropped: deciding whether to return the report of the dropped orders per delivery hour as well (bool)
+        legacy_key: deciding whether to write the 'Executed Price & Volume' tuple columns of the former layout (bool)
+    Return:
+        pivoted: pivoted table showing transactions for confy visualization (Pandas DataFrame)
+        pivoted_levels: pivoted table showing transactions for further analysis (Pandas DataFrame)
+        dropped: orders dropped per delivery hour, only with return_dropped (Pandas DataFrame)
+    """
+
+    # the pivot table groups drop the orders with missing keys
+    df_sorted = add_transaction_keys(df_filtered).dropna(subset=TRANSACTION_KEYS)
+
+    # the sort is stable so that orders of the same group keep the order of the LOB as in the pivot lists
+    df_sorted = df_sorted.sort_values(by=TRANSACTION_KEYS, kind='mergesort')
+
+    # same layout and data types of the exploded pivot table
+    values = sorted(TRANSACTION_VALUES)
+    pivoted = df_sorted[TRANSACTION_KEYS+values]
+    pivoted = pivoted.astype(
+        {col: object for col in values if col != 'lead_time'})
+    pivoted = pivoted.set_index(TRANSACTION_KEYS)
+
+    problematic = find_problematic_dates(
+        pivoted) if unbounded_contract else []
+    if return_dropped:
+        dropped = dropped_trades_report(pivoted, problematic)
+
+    if unbounded_contract:
+        pivoted = pivoted[~pivoted.index.get_level_values(
+            'End Validity Date').isin(problematic)]
+
+    # the n-th buy order is paired with the n-th sell order of the sorted table
+    pivoted_levels = pair_transactions(pivoted, legacy_key=legacy_key)
+
+    if return_dropped:
+        return pivoted, pivoted_levels, dropped
+
+    return pivoted, pivoted_levels
+
+
+def prepare_new_transactions(path, lead_window=(30, 60), vectorized=True):
     """
 
     This function filters and prepare the contracts for the months of November and December to be analysed
 
     Args:
         path: ALPIQ transactions dataframe path (Pandas DataFrame)
+        lead_window: minimum and maximum lead time in minutes, both included (tuple)
+        vectorized: deciding whether to parse and repair the dates on whole columns or row by row (bool)
     Return:
-        df_list: list of daily dataframes with transactions to be saved and fed to the optimizer (list)
+        days: daily dataframes with transactions to be saved and fed to the optimizer, with the name of their
+            daily file (generator)
 
     """
 
@@ -173,6 +617,100 @@ def prepare_new_transactions(path):
     df = pd.read_csv(path,
                      usecols=[i for i in cols if 'Unnamed' not in i])
 
+    if vectorized:
+        df = repair_new_transactions_dates(df)
+    else:
+        df = repair_new_transactions_dates_loop(df)
+
+    # define lead time
+    df['lead_time'] = df['FROM_TIME']-df['TIMESTAMP']
+
+    # define logical statement to filter rows based on lead time, converted to minutes once
+    lead_minutes = df['lead_time'].dt.total_seconds()/60
+    logical_statement_lead_time = (lead_minutes >= lead_window[0]) & (
+        lead_minutes <= lead_window[1])
+
+    # filter the dataframe based on logical statement
+    df_filtered = df[logical_statement_lead_time]
+
+    # add columns for pipeline compatibility
+    df_filtered['End Validity Date'] = df_filtered['TIMESTAMP']
+    df_filtered['Execution Price'] = df_filtered['PRICE']
+    df_filtered['Executed Volume'] = df_filtered['VOLUME']
+    df_filtered['Delivery Start'] = df_filtered['FROM_TIME']
+    if vectorized:
+        df_filtered['Instrument Type'] = df_filtered['DURATION'].map(
+            DURATION_INSTRUMENT_TYPE)
+        if df_filtered['Instrument Type'].isna().any():
+            raise KeyError(
+                f'Unknown durations {df_filtered["DURATION"][df_filtered["Instrument Type"].isna()].unique()}')
+    else:
+        df_filtered['Instrument Type'] = df_filtered['DURATION'].apply(
+            lambda x: map_duration(x))
+
+    return split_daily_transactions(df_filtered)
+
+
+def parse_new_transactions_time(col):
+    """
+
+    This function parses a time column of the ALPIQ transactions, the strings without hour being read at midnight
+
+    Args:
+        col: time strings as '%m/%d/%y %H:%M' or '%m/%d/%y' (Pandas Series)
+    Return:
+        parsed: parsed times (Pandas Series)
+        has_time: whether each string presents the hour as well (Pandas Series)
+
+    """
+
+    parsed = pd.to_datetime(
+        col, utc=True, format=NEW_TRANSACTIONS_TIME_FORMAT, errors='coerce')
+    has_time = parsed.notna()
+
+    if not has_time.all():
+        parsed.loc[~has_time] = pd.to_datetime(
+            col[~has_time].astype(str)+' 0:0', utc=True, format=NEW_TRANSACTIONS_TIME_FORMAT)
+
+    return parsed, has_time
+
+
+def repair_new_transactions_dates(df):
+    """
+
+    This function parses the time columns of the ALPIQ transactions and repairs the delivery times given without
+    hour from the other end of the delivery and its duration, on whole columns
+
+    Args:
+        df: raw ALPIQ transactions (Pandas DataFrame)
+    Return:
+        df: transactions with parsed and repaired times, whose timestamp presents the hour (Pandas DataFrame)
+
+    """
+
+    # format time presenting hour as well
+    df['FROM_TIME'], df['problem_from_time'] = parse_new_transactions_time(
+        df['FROM_TIME'])
+    df['TO_TIME'], df['problem_to_time'] = parse_new_transactions_time(
+        df['TO_TIME'])
+    df['TIMESTAMP'], df['problem_timestamp'] = parse_new_transactions_time(
+        df['TIMESTAMP'])
+
+    # remove unusable columns
+    df = df[df['problem_timestamp']]
+
+    # modify dates mistakes, the end of the delivery is repaired from the repaired start
+    duration = pd.to_timedelta(df['DURATION'], unit='hours')
+    df['FROM_TIME'] = df['FROM_TIME'].where(
+        df['problem_from_time'], df['TO_TIME']-duration)
+    df['TO_TIME'] = df['TO_TIME'].where(
+        df['problem_to_time'], df['FROM_TIME']+duration)
+
+    return df
+
+
+def repair_new_transactions_dates_loop(df):
+
     # format time presenting hour as well
     df['problem_from_time'] = df['FROM_TIME'].apply(lambda x: isTimeFormat(x))
     df['problem_to_time'] = df['TO_TIME'].apply(lambda x: isTimeFormat(x))
@@ -201,54 +739,31 @@ def prepare_new_transactions(path):
     df['TO_TIME'] = df.apply(lambda x: correct_to_time(
         x['problem_to_time'], x['TO_TIME'], x['FROM_TIME'], x['DURATION']), axis=1)
 
-    # define lead time
-    df['lead_time'] = df['FROM_TIME']-df['TIMESTAMP']
-
-    # define logical statement to filter rows based on lead time
-    logical_statement_lead_time = (df['lead_time'].dt.total_seconds(
-    )/60 >= 30) & (df['lead_time'].dt.total_seconds()/60 <= 60)
-
-    # filter the dataframe based on logical statement
-    df_filtered = df[logical_statement_lead_time]
-
-    # add columns for pipeline compatibility
-    df_filtered['End Validity Date'] = df_filtered['TIMESTAMP']
-    df_filtered['Execution Price'] = df_filtered['PRICE']
-    df_filtered['Executed Volume'] = df_filtered['VOLUME']
-    df_filtered['Delivery Start'] = df_filtered['FROM_TIME']
-    df_filtered['Instrument Type'] = df_filtered['DURATION'].apply(
-        lambda x: map_duration(x))
-
-    df_list, file_names = split_daily_transactions(df_filtered)
-
-    return df_list, file_names
+    return df
 
 
 def split_daily_transactions(df):
+    """
 
-    min_date_day = df['FROM_TIME'].dt.day.min()
-    max_date_day = df['FROM_TIME'].dt.day.max()
-    month = str(df['FROM_TIME'].dt.month.iloc[0])
+    This function partitions the transactions by calendar delivery date in a single pass, over any number of
+    months and years, handing the days out one at a time
 
-    df_list = []
-    file_names = []
-    for day in range(min_date_day, max_date_day+1):
+    Args:
+        df: prepared transactions (Pandas DataFrame)
+    Return:
+        days: transactions of each delivery date in time order with the name of their daily file (generator)
 
-        df_day = df[df['FROM_TIME'].dt.day == day]
-        df_list.append(df_day)
+    """
 
-        day_string = str(day) if len(str(day)) == 2 else '0'+str(day)
-        name = 'DE_2019'+month+day_string+'.csv'
-        file_names.append(name)
+    delivery_date = df['FROM_TIME'].dt.normalize()
 
-    return df_list, file_names
+    for day, df_day in df.groupby(delivery_date, sort=True):
+        yield df_day, 'DE_'+day.strftime('%Y%m%d')+'.csv'
 
 
 def map_duration(duration):
 
-    d = {0.25: 'Quarter Hour', 0.5: 'Half Hour', 1: 'Hour'}
-
-    return d[duration]
+    return DURATION_INSTRUMENT_TYPE[duration]
 
 
 def correct_to_time(problem, to_time, from_time, duration):
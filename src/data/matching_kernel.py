@@ -0,0 +1,123 @@
+import numpy as np
+
+# numba is optional: without it the same kernel runs as plain NumPy code
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def allocate(request, values_NTC, values_pw, start_NTC, end_NTC, start_pw, end_pw):
+    """
+    This function allocates one contract on the NTC and power limit rows it spans, with the binding
+    conditions of optimize_selling and optimize_pumping
+
+    Args:
+        request: executed volume times the instrument multiplier (float)
+        values_NTC: remaining NTC capacity sorted by slot, updated in place (numpy array)
+        values_pw: remaining power limit capacity sorted by slot, updated in place (numpy array)
+        start_NTC, end_NTC, start_pw, end_pw: range of rows of the contract (int)
+    Return:
+        binary outcome: 1 matched, 2 NTC binding, 3 power binding, 4 both binding (int)
+
+    """
+
+    diff_NTC = values_NTC[start_NTC:end_NTC] - request
+    diff_pw = values_pw[start_pw:end_pw] - request
+
+    if np.all(diff_NTC >= 0) and np.all(diff_pw >= 0):
+        values_NTC[start_NTC:end_NTC] = diff_NTC
+        values_pw[start_pw:end_pw] = diff_pw
+        return 1
+
+    elif np.all(diff_NTC < 0) and np.all(diff_pw >= 0):
+        values_NTC[start_NTC:end_NTC] = 0
+        values_pw[start_pw:end_pw] = diff_pw
+        return 2
+
+    elif np.all(diff_NTC >= 0) and np.all(diff_pw < 0):
+        values_NTC[start_NTC:end_NTC] = diff_NTC
+        values_pw[start_pw:end_pw] = 0
+        return 3
+
+    else:
+        values_NTC[start_NTC:end_NTC] = 0
+        values_pw[start_pw:end_pw] = 0
+        return 4
+
+
+def greedy_pass(order, eligible, request, start_NTC, end_NTC, start_pw, end_pw, values_NTC, values_pw):
+    """
+    This function allocates the contracts one after the other in the given order
+
+    Args:
+        order: positions of the contracts in allocation order (numpy array)
+        eligible: whether each contract is matchable according to the hydro marginal price (numpy array)
+        request: executed volume times the instrument multiplier of each contract (numpy array)
+        start_NTC, end_NTC, start_pw, end_pw: range of rows of each contract (numpy arrays)
+        values_NTC: remaining NTC capacity sorted by slot, updated in place (numpy array)
+        values_pw: remaining power limit capacity sorted by slot, updated in place (numpy array)
+    Return:
+        outcome: binary outcome of each contract, 0 where not eligible (numpy array)
+
+    """
+
+    outcome = np.zeros(len(order), dtype=np.int64)
+
+    for i in order:
+        if eligible[i]:
+            outcome[i] = allocate(request[i], values_NTC, values_pw,
+                                  start_NTC[i], end_NTC[i], start_pw[i], end_pw[i])
+
+    return outcome
+
+
+if numba is not None:
+    allocate = numba.njit(cache=True)(allocate)
+    greedy_pass = numba.njit(cache=True)(greedy_pass)
+
+
+def greedy_matching(ledger, volume, multiplier, delivery_start, instrument_type, eligible_pumping, eligible_selling, order_selling, execution_price, marginal_price_selling, marginal_price_pumping):
+    """
+    This function runs the full greedy allocation of a day on plain arrays: pumping in the given order
+    (ascending price), then selling in order_selling (descending price), and derives the a posteriori prices
+
+    Args:
+        ledger: capacity state of the welfare model, updated in place (CapacityLedger)
+        volume: executed volume of each contract (numpy array)
+        multiplier: number of slots per hour of the instrument of each contract (numpy array)
+        delivery_start: delivery start of each contract (Pandas Series)
+        instrument_type: instrument type of each contract (Pandas Series)
+        eligible_pumping: whether each contract is matchable for pumping (numpy array)
+        eligible_selling: whether each contract is matchable for selling (numpy array)
+        order_selling: positions of the contracts in selling order (numpy array)
+        execution_price: historical execution price of each contract (numpy array)
+        marginal_price_selling: hydro marginal price for selling of each contract (numpy array)
+        marginal_price_pumping: hydro marginal price for pumping of each contract (numpy array)
+    Return:
+        outcome_pumping: pumping binary outcome of each contract (numpy array)
+        outcome_selling: selling binary outcome of each contract (numpy array)
+        a_posteriori_price: a posteriori execution price of each contract (numpy array)
+
+    """
+
+    request = np.asarray(volume, dtype=np.float64) * \
+        np.asarray(multiplier, dtype=np.int64)
+    start_NTC, end_NTC, start_pw, end_pw = ledger.contract_rows(
+        delivery_start, instrument_type)
+
+    outcomes = {}
+    for side, order, eligible in [('pumping', np.arange(len(request)), eligible_pumping),
+                                  ('selling', order_selling, eligible_selling)]:
+
+        col_NTC, col_pw = ledger.columns[side]
+        outcomes[side] = greedy_pass(np.asarray(order, dtype=np.int64), np.asarray(eligible, dtype=np.bool_), request,
+                                     start_NTC, end_NTC, start_pw, end_pw,
+                                     ledger.values[col_NTC], ledger.values[col_pw])
+
+    # vectorized update_execution_price
+    a_posteriori_price = np.where((outcomes['selling'] == 1) & (outcomes['pumping'] == 0), marginal_price_selling,
+                                  np.where((outcomes['selling'] == 0) & (outcomes['pumping'] == 1), marginal_price_pumping,
+                                           execution_price))
+
+    return outcomes['pumping'], outcomes['selling'], a_posteriori_price
@@ -0,0 +1,274 @@
+import glob
+import os
+import pathlib
+import pandas as pd
+
+from src.data.helper_closed_transactions import LEGACY_KEY, lead_time_bins_in_window, select_lead_window
+
+# outputs of the complete pipeline, the first two in the interim folder and the last one in the processed folder
+STAGES = ['Filtered Orders', 'Transactions', 'Updated Transactions']
+
+# executed orders of the parsed LOB bucketed by lead time, in the interim folder
+LEAD_TIME_BINS_STAGE = 'Lead Time Bins'
+
+
+def day_file_name(day, extension='csv'):
+
+    # daily files are named after the delivery day as DE_YYYYMMDD
+    return f'DE_{pd.Timestamp(day).strftime("%Y%m%d")}.{extension}'
+
+
+def month_partition(day):
+
+    # hive style partition so that the datasets can be pruned by month
+    return f'month={pd.Timestamp(day).strftime("%Y-%m")}'
+
+
+def typed_frame(df):
+    """
+    This function gives the pipeline outputs the column types stored in the Parquet datasets: object columns
+    holding numbers become numeric and the instrument types become categorical
+
+    Args:
+        df: daily output of a pipeline stage (Pandas DataFrame)
+    Return:
+        df_typed: typed daily output (Pandas DataFrame)
+
+    """
+
+    # the tuple key repeats the execution price and volume and has no Parquet type
+    df_typed = df.drop(columns=[col for col in df.columns if col.startswith(LEGACY_KEY)])
+
+    for col in df_typed.columns[df_typed.dtypes == object]:
+
+        kind = pd.api.types.infer_dtype(df_typed[col], skipna=True)
+        if kind == 'integer' and not df_typed[col].isna().any():
+            df_typed[col] = df_typed[col].astype('int64')
+        elif kind in ['integer', 'floating', 'mixed-integer-float']:
+            df_typed[col] = df_typed[col].astype('float64')
+
+    for col in df_typed.columns[df_typed.columns.str.startswith('Instrument Type')]:
+        df_typed[col] = df_typed[col].astype('category')
+
+    return df_typed
+
+
+def write_day(df, base_folder, stage, day):
+    """
+    This function writes the daily output of a pipeline stage in the month partition of its Parquet dataset
+
+    Args:
+        df: daily output of the stage (Pandas DataFrame)
+        base_folder: interim or processed folder of the pipeline run (pathlib.Path)
+        stage: one of STAGES (string)
+        day: delivery day (pd.Timestamp)
+    Return:
+        path: location of the written file (pathlib.Path)
+
+    """
+
+    folder = pathlib.Path(base_folder) / stage / month_partition(day)
+    os.makedirs(folder, exist_ok=True)
+
+    df_typed = typed_frame(df)
+    df_typed.insert(0, 'day', pd.Timestamp(day))
+
+    path = folder / day_file_name(day, extension='parquet')
+    df_typed.to_parquet(path, index=False)
+
+    return path
+
+
+def is_parquet_run(base_folder, stage='Updated Transactions'):
+
+    return (pathlib.Path(base_folder) / stage).is_dir()
+
+
+def read_stage(base_folder, stage='Updated Transactions', months=None, columns=None):
+    """
+    This function reads the whole output of a pipeline stage, only scanning the requested months and columns
+
+    Args:
+        base_folder: interim or processed folder of the pipeline run (string or pathlib.Path)
+        stage: one of STAGES (string)
+        months: months to read as 'YYYY-MM', None to read every month (list)
+        columns: columns to read, None to read every column (list)
+    Return:
+        df: output of the stage with the delivery day of each row in the 'day' column (Pandas DataFrame)
+
+    """
+
+    if is_parquet_run(base_folder, stage):
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(pathlib.Path(base_folder) / stage,
+                             format='parquet', partitioning='hive')
+        filter_months = ds.field('month').isin(
+            months) if months is not None else None
+        table = dataset.to_table(columns=None if columns is None else ['day']+[col for col in columns if col != 'day'],
+                                 filter=filter_months)
+
+        return table.to_pandas().sort_values('day', kind='mergesort').reset_index(drop=True)
+
+    # daily csv files of the former layout
+    df = read_day_files(day_paths(base_folder, stage,
+                                  months=months), columns=columns)
+
+    return df[['day']+[col for col in df.columns if col != 'day']]
+
+
+def day_paths(base_folder, stage='Updated Transactions', months=None):
+    """
+    This function lists the daily files of a pipeline stage ordered in time, Parquet files of the datasets
+    or daily csv files of the former layout
+
+    Args:
+        base_folder: interim or processed folder of the pipeline run (string or pathlib.Path)
+        stage: one of STAGES (string)
+        months: months to list as 'YYYY-MM', None to list every month (list)
+    Return:
+        paths: delivery day and location of each daily file (list)
+
+    """
+
+    if is_parquet_run(base_folder, stage):
+        pattern = pathlib.Path(base_folder) / stage / 'month=*' / 'DE_*.parquet'
+    else:
+        pattern = pathlib.Path(base_folder) / '*' / stage / 'DE_*.csv'
+
+    paths = []
+    for filepath in glob.glob(str(pattern)):
+
+        day = pd.Timestamp(filepath.split('/')[-1].split('.')[0][-8:])
+        if months is None or day.strftime('%Y-%m') in months:
+            paths.append((day, filepath))
+
+    return sorted(paths)
+
+
+def read_day_files(paths, columns=None):
+    """
+    This function reads a selection of daily files of a pipeline stage into a single dataframe
+
+    Args:
+        paths: delivery day and location of each daily file, as listed by day_paths (list)
+        columns: columns to read, None to read every column (list)
+    Return:
+        df: rows of the daily files with the delivery day of each row in the 'day' column (Pandas DataFrame)
+
+    """
+
+    df_list = []
+    for day, path in paths:
+
+        if str(path).endswith('.parquet'):
+            df = pd.read_parquet(path, columns=columns)
+        else:
+            df = pd.read_csv(path, usecols=columns)
+
+        df['day'] = pd.Timestamp(day)
+        df_list.append(df)
+
+    return pd.concat(df_list, ignore_index=True)
+
+
+def read_day(base_folder, day, stage='Updated Transactions', columns=None):
+    """
+    This function reads the output of a pipeline stage for a single delivery day, from the Parquet dataset
+    or from the daily csv files of the former layout
+
+    Args:
+        base_folder: interim or processed folder of the pipeline run (string or pathlib.Path)
+        day: delivery day (string, date or pd.Timestamp)
+        stage: one of STAGES (string)
+        columns: columns to read, None to read every column (list)
+    Return:
+        df: daily output of the stage (Pandas DataFrame)
+
+    """
+
+    if is_parquet_run(base_folder, stage):
+        return pd.read_parquet(pathlib.Path(base_folder) / stage / month_partition(day) / day_file_name(day, extension='parquet'),
+                               columns=columns)
+
+    return pd.read_csv(pathlib.Path(base_folder) / pd.Timestamp(day).strftime('%Y-%m') / stage / day_file_name(day),
+                       usecols=columns)
+
+
+def lead_bin_partition(window):
+
+    # hive style partition of a lead time bin, e.g. 'lead=30-60'
+    return f'lead={window[0]}-{window[1]}'
+
+
+def write_lead_time_bins(partitions, base_folder, day):
+    """
+    This function writes the executed orders of a day in one Parquet file per lead time bin, keeping the LOB
+    position of the orders in the index
+
+    Args:
+        partitions: executed orders of each bin keyed by its edges, as given by partition_lead_time (dict)
+        base_folder: interim folder of the pipeline run (pathlib.Path)
+        day: delivery day (pd.Timestamp)
+
+    """
+
+    for window, df_bin in partitions.items():
+
+        folder = pathlib.Path(base_folder) / LEAD_TIME_BINS_STAGE / \
+            lead_bin_partition(window) / month_partition(day)
+        os.makedirs(folder, exist_ok=True)
+
+        # the tuple key has no Parquet type, it is added back when a window is read
+        df_bin.drop(columns=[col for col in df_bin.columns if col.startswith(LEGACY_KEY)]).to_parquet(
+            folder / day_file_name(day, extension='parquet'))
+
+
+def lead_time_bin_edges(base_folder):
+
+    # edges of the lead time bins written in the folder
+    folders = glob.glob(
+        str(pathlib.Path(base_folder) / LEAD_TIME_BINS_STAGE / 'lead=*'))
+    if not folders:
+        raise ValueError(
+            f'{base_folder} has no {LEAD_TIME_BINS_STAGE} stage, run the complete pipeline with --lead-time-bins to write it')
+
+    return sorted(tuple(int(edge) for edge in folder.split('lead=')[-1].split('-')) for folder in folders)
+
+
+def lead_time_bin_days(base_folder):
+
+    # delivery days with lead time bins, ordered in time
+    windows = lead_time_bin_edges(base_folder)
+
+    return [day for day, _ in day_paths(base_folder, stage=f'{LEAD_TIME_BINS_STAGE}/{lead_bin_partition(windows[0])}')]
+
+
+def read_lead_window(base_folder, day, lead_window, legacy_key=False):
+    """
+    This function derives the filtered LOB of a day for a lead time window reading only the lead time bins
+    overlapping the window
+
+    Args:
+        base_folder: interim folder of the pipeline run (string or pathlib.Path)
+        day: delivery day (string, date or pd.Timestamp)
+        lead_window: minimum and maximum lead time in minutes, both included (tuple)
+        legacy_key: deciding whether to add the 'Executed Price & Volume' tuple column of the former layout (bool)
+    Return:
+        df_filtered: dataframe with filtered LOB (Pandas DataFrame)
+        unbounded_contract: whether the executed buy and sell volumes differ (bool)
+
+    """
+
+    partitions = {window: pd.read_parquet(pathlib.Path(base_folder) / LEAD_TIME_BINS_STAGE / lead_bin_partition(window) /
+                                          month_partition(day) / day_file_name(day, extension='parquet'))
+                  for window in lead_time_bins_in_window(lead_time_bin_edges(base_folder), lead_window)}
+
+    df_filtered, unbounded_contract = select_lead_window(
+        partitions, lead_window)
+
+    if legacy_key:
+        df_filtered.insert(df_filtered.columns.get_loc('Delivery Start'), LEGACY_KEY, list(
+            zip(df_filtered['Execution Price'], df_filtered['Executed Volume'])))
+
+    return df_filtered, unbounded_contract
@@ -0,0 +1,140 @@
+import contextlib
+import os
+import resource
+import time
+import tracemalloc
+import pandas as pd
+
+
+def peak_rss_mb():
+    """
+    This function returns the peak resident memory of the current process in MB
+
+    Return:
+        peak_rss: high water mark of the resident set (float)
+
+    """
+
+    # high water mark of the resident set of the process, read from /proc where available
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])/1024
+    except OSError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+
+
+def reset_peak_rss():
+
+    # writing 5 to clear_refs resets the high water mark on linux, elsewhere the peak is kept
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def p50(series):
+
+    return series.quantile(0.5)
+
+
+def p95(series):
+
+    return series.quantile(0.95)
+
+
+class StageMetrics:
+    """
+    Wall time, CPU time, peak memory and row count of every stage of the daily pipeline, one record per
+    stage and day. The peak resident set is the high water mark of the process during the stage
+
+    Args:
+        path: run metrics csv file the records are appended to, None to only keep them in memory (pathlib.Path)
+        trace_memory: deciding whether to also record the peak of the memory traced by tracemalloc, which
+            slows down the allocations (bool)
+
+    """
+
+    measures = ['wall_seconds', 'cpu_seconds',
+                'peak_rss_mb', 'peak_traced_mb', 'rows']
+
+    def __init__(self, path=None, trace_memory=False):
+
+        self.path = path
+        self.trace_memory = trace_memory
+        self.records = []
+
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, day, name):
+        """
+        Context measuring a stage of the pipeline for a day, the rows produced by the stage are set in the
+        'rows' entry of the yielded record
+
+        Args:
+            day: delivery day (pd.Timestamp)
+            name: name of the stage (string)
+
+        """
+
+        record = {'day': pd.Timestamp(day).strftime('%Y-%m-%d'),
+                  'stage': name, 'pid': os.getpid(), 'rows': None}
+
+        reset_peak_rss()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        yield record
+
+        record['wall_seconds'] = time.perf_counter()-wall
+        record['cpu_seconds'] = time.process_time()-cpu
+        record['peak_rss_mb'] = peak_rss_mb()
+        record['peak_traced_mb'] = tracemalloc.get_traced_memory()[
+            1]/2**20 if self.trace_memory else None
+
+        self.records.append(record)
+
+    def pop_records(self):
+
+        # records not written yet, used to send the records of a worker back to the main process
+        records, self.records = self.records, []
+
+        return records
+
+    def flush(self):
+
+        # records are appended after every day so that an interrupted run keeps the metrics of its finished days
+        records = self.pop_records()
+        if records and self.path is not None:
+            pd.DataFrame(records, columns=['day', 'stage', 'pid']+self.measures).to_csv(
+                self.path, mode='a', header=not os.path.isfile(self.path), index=False)
+
+    def summary(self):
+        """
+        This function summarises the run metrics file per stage
+
+        Return:
+            df_summary: p50, p95 and max of the measures of each stage over the days (Pandas DataFrame)
+
+        """
+
+        df = pd.read_csv(self.path)
+        measures = [col for col in self.measures if df[col].notna().any()]
+
+        return df.groupby('stage', sort=False)[measures].agg([p50, p95, 'max'])
+
+    def report(self):
+
+        if self.path is None or not os.path.isfile(self.path):
+            return
+
+        with pd.option_context('display.max_columns', None, 'display.width', 200):
+            print('\n Stage metrics over the days of the run\n',
+                  self.summary().round(3))
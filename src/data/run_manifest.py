@@ -0,0 +1,190 @@
+import glob
+import hashlib
+import json
+import os
+import pathlib
+import numpy as np
+import pandas as pd
+
+from src.data.welfare_complete import CapacityLedger
+
+
+def file_checksum(path):
+
+    # sha1 of the file content read in blocks
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+
+    return sha1.hexdigest()
+
+
+def input_signature(path):
+
+    stat = os.stat(path)
+
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': file_checksum(path)}
+
+
+def same_input(signature, path):
+
+    # the checksum is only computed again when the file was touched since it was recorded
+    if not os.path.isfile(path):
+        return False
+
+    stat = os.stat(path)
+    if stat.st_size == signature['size'] and stat.st_mtime_ns == signature['mtime_ns']:
+        return True
+
+    return file_checksum(path) == signature['sha1']
+
+
+class RunManifest:
+    """
+    Manifest of a complete pipeline run, recording the days whose outputs are saved together with the hash of
+    their input and the capacity state left after them, so that an interrupted run can be resumed in the same folder
+
+    Args:
+        folder: interim folder of the pipeline run (pathlib.Path)
+        options: options of the run changing its outputs (dict)
+        static_paths: static input files of the run, weekly prices, NTC and power limit (list)
+
+    """
+
+    def __init__(self, folder, options, static_paths):
+
+        self.folder = pathlib.Path(folder)
+        self.path = self.folder / 'run_manifest.json'
+        self.options = options
+        self.static_paths = [os.path.abspath(path) for path in static_paths]
+        self.manifest = None
+
+    def checkpoint_path(self, n_days):
+
+        return self.folder / f'capacity_checkpoint_{n_days}.npz'
+
+    def capacity_columns(self):
+
+        # update columns of NTC and power limit holding the capacity state of the welfare model
+        return [col for col, _ in CapacityLedger.columns.values()], [col for _, col in CapacityLedger.columns.values()]
+
+    def new_manifest(self):
+
+        return {'options': self.options,
+                'static_inputs': {path: input_signature(path) for path in self.static_paths},
+                'days': [],
+                'checkpoint': None}
+
+    def resume(self, ordered_paths, NTC, pw):
+        """
+        This function finds the days already completed by a previous run in the folder and restores the capacity
+        state saved after the last of them
+
+        Args:
+            ordered_paths: raw files of the run ordered in time (list)
+            NTC: prepared NTC dataframe updated in place (Pandas DataFrame)
+            pw: prepared power limit dataframe updated in place (Pandas DataFrame)
+        Return:
+            n_done: number of days at the start of ordered_paths which are skipped (int)
+
+        """
+
+        if not self.path.is_file():
+            self.manifest = self.new_manifest()
+            return 0
+
+        with open(self.path) as f:
+            self.manifest = json.load(f)
+
+        if self.manifest['options'] != self.options:
+            raise ValueError(
+                f'The run in {self.folder} was started with the options {self.manifest["options"]}, not {self.options}')
+
+        # changed static data make every day of the run outdated
+        if sorted(self.manifest['static_inputs']) != sorted(self.static_paths) or \
+                not all(same_input(signature, path) for path, signature in self.manifest['static_inputs'].items()):
+            print(f'\n Static data changed since the run in {self.folder} started, restarting from the first day')
+            self.manifest = self.new_manifest()
+            return 0
+
+        # the capacity state is carried from day to day, only an unchanged prefix of the run can be skipped
+        n_done = 0
+        for entry, opath in zip(self.manifest['days'], ordered_paths):
+            if entry['source'] != os.path.abspath(opath) or not same_input(entry['input'], opath):
+                break
+            n_done += 1
+
+        checkpoint = self.manifest['checkpoint']
+        if n_done < len(self.manifest['days']) or (n_done > 0 and (checkpoint is None or checkpoint['n_days'] != n_done or
+                                                                   not self.checkpoint_path(n_done).is_file() or
+                                                                   file_checksum(self.checkpoint_path(n_done)) != checkpoint['sha1'])):
+            print(f'\n Completed days of the run in {self.folder} changed, restarting from the first day')
+            self.manifest = self.new_manifest()
+            return 0
+
+        if n_done > 0:
+            self.restore_capacity(NTC, pw, self.checkpoint_path(n_done))
+
+        print(f'\n Resuming the run in {self.folder} after {n_done} completed days')
+
+        return n_done
+
+    def restore_capacity(self, NTC, pw, checkpoint_path):
+
+        cols_NTC, cols_pw = self.capacity_columns()
+        with np.load(checkpoint_path) as checkpoint:
+            for df, cols in [(NTC, cols_NTC), (pw, cols_pw)]:
+                for col in cols:
+                    df.iloc[:, df.columns.get_loc(col)] = checkpoint[col]
+
+    def dropped_reports(self):
+        """
+        This function returns the reports of the orders dropped per delivery hour of the completed days
+
+        Return:
+            dropped_reports: one report per completed day (list)
+
+        """
+
+        return [pd.DataFrame(data=entry['dropped'], index=pd.RangeIndex(24, name='Delivery Hour'))
+                for entry in self.manifest['days']]
+
+    def record_day(self, opath, dropped, NTC, pw):
+        """
+        This function records a day whose outputs are saved, with the capacity state left after it
+
+        Args:
+            opath: raw file of the day (string)
+            dropped: orders dropped per delivery hour of the day (Pandas DataFrame)
+            NTC: prepared NTC dataframe holding the capacity state after the day (Pandas DataFrame)
+            pw: prepared power limit dataframe holding the capacity state after the day (Pandas DataFrame)
+
+        """
+
+        n_days = len(self.manifest['days'])+1
+
+        # checkpoint of the day written first, the manifest is the last file to change
+        cols_NTC, cols_pw = self.capacity_columns()
+        arrays = {col: NTC[col].to_numpy(dtype=float) for col in cols_NTC}
+        arrays.update({col: pw[col].to_numpy(dtype=float) for col in cols_pw})
+
+        checkpoint_path = self.checkpoint_path(n_days)
+        with open(str(checkpoint_path)+'.tmp', 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(str(checkpoint_path)+'.tmp', checkpoint_path)
+
+        self.manifest['days'].append({'source': os.path.abspath(opath),
+                                      'input': input_signature(opath),
+                                      'dropped': {col: dropped[col].tolist() for col in dropped.columns}})
+        self.manifest['checkpoint'] = {'n_days': n_days,
+                                       'sha1': file_checksum(checkpoint_path)}
+
+        with open(str(self.path)+'.tmp', 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(str(self.path)+'.tmp', self.path)
+
+        # older checkpoints are not needed anymore
+        for path in glob.glob(str(self.folder / 'capacity_checkpoint_*.npz')):
+            if pathlib.Path(path) != checkpoint_path:
+                os.remove(path)
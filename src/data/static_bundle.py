@@ -0,0 +1,94 @@
+import json
+import os
+import pathlib
+import numpy as np
+
+# version of the bundle layout, bundles written by another version are rebuilt from the csv files
+STATIC_BUNDLE_VERSION = 1
+
+BUNDLE_MAGIC = b'STATICBUNDLE'
+
+# arrays start on multiples of this many bytes so that every memory-mapped array is aligned
+BUNDLE_ALIGNMENT = 64
+
+
+def aligned(n_bytes):
+
+    return -(-n_bytes//BUNDLE_ALIGNMENT)*BUNDLE_ALIGNMENT
+
+
+def write_bundle(path, arrays, metadata):
+    """
+    This function writes NumPy arrays and their metadata into a single binary file: a JSON header giving the
+    dtype, shape and offset of every array followed by the raw arrays
+
+    Args:
+        path: bundle file location path (string or pathlib.Path)
+        arrays: arrays stored in the bundle by name (dict)
+        metadata: JSON serialisable description of the content (dict)
+
+    """
+
+    path = pathlib.Path(path)
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': array.dtype.str,
+                        'shape': list(array.shape), 'offset': offset}
+        offset = aligned(offset+array.nbytes)
+
+    header = json.dumps({'version': STATIC_BUNDLE_VERSION, 'metadata': metadata,
+                         'arrays': layout}).encode()
+    data_start = aligned(len(BUNDLE_MAGIC)+8+len(header))
+
+    os.makedirs(path.parent, exist_ok=True)
+
+    # write to a temporary file first so that an interrupted build never leaves a truncated bundle
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(BUNDLE_MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start+layout[name]['offset'])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start+offset)
+    os.replace(tmp_path, path)
+
+
+def read_bundle(path):
+    """
+    This function memory-maps the arrays of a bundle written by write_bundle, no array is read before it is used
+
+    Args:
+        path: bundle file location path (string or pathlib.Path)
+    Return:
+        arrays: read-only memory-mapped arrays by name (dict)
+        metadata: description of the content (dict)
+
+    """
+
+    with open(path, 'rb') as f:
+        if f.read(len(BUNDLE_MAGIC)) != BUNDLE_MAGIC:
+            raise ValueError(f'{path} is not a static data bundle')
+        header_length = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        header = json.loads(f.read(header_length))
+
+    if header['version'] != STATIC_BUNDLE_VERSION:
+        raise ValueError(
+            f'{path} was written with the bundle version {header["version"]}, the current version is {STATIC_BUNDLE_VERSION}')
+
+    data_start = aligned(len(BUNDLE_MAGIC)+8+header_length)
+
+    arrays = {}
+    for name, layout in header['arrays'].items():
+        shape = tuple(layout['shape'])
+        if np.prod(shape) == 0:
+            # empty arrays cannot be memory-mapped
+            arrays[name] = np.empty(shape, dtype=layout['dtype'])
+        else:
+            arrays[name] = np.memmap(path, dtype=layout['dtype'], mode='r',
+                                     offset=data_start+layout['offset'], shape=shape)
+
+    return arrays, header['metadata']
@@ -0,0 +1,548 @@
+import io
+import json
+import os
+import pathlib
+import numpy as np
+import pandas as pd
+
+from src.data.processed_dataset import read_stage, day_paths, read_day_files
+from src.data.run_manifest import file_checksum
+
+# columns of the updated transactions used by the summary
+SUMMARY_COLUMNS = ['Delivery Start', 'Executed Volume', 'Execution Price', 'A posteriori Execution Price',
+                   'match_binary_outcome_selling', 'match_binary_outcome_pumping']
+
+# flow directions with the outcome of the welfare model matching the contracts in that direction
+DIRECTIONS = {'CH-DE': 'match_binary_outcome_selling',
+              'DE-CH': 'match_binary_outcome_pumping'}
+
+# file of the hourly rollup written alongside the summary csv
+HOURLY_ROLLUP_NAME = 'hourly_rollup.parquet'
+
+
+def load_transactions(folder_root_path, months=None):
+    """
+    This function loads the updated transactions of every day of a pipeline run once into a single typed frame
+
+    Args:
+        folder_root_path: processed folder of the pipeline run (string)
+        months: months to load as 'YYYY-MM', None to load every month (list)
+    Return:
+        df_transactions: updated transactions ordered by day (Pandas DataFrame)
+
+    """
+
+    df_transactions = read_stage(
+        folder_root_path, stage='Updated Transactions', months=months, columns=SUMMARY_COLUMNS)
+
+    df_transactions['day'] = pd.to_datetime(df_transactions['day'])
+    df_transactions['Delivery Start'] = pd.to_datetime(
+        df_transactions['Delivery Start'], utc=True)
+
+    return df_transactions
+
+
+def segment_sum(values, bounds):
+
+    # numpy pairwise sum of each contiguous day, the same summation of the per day pandas and numpy sums
+    return np.array([values[start:end].sum() for start, end in zip(bounds[:-1], bounds[1:])], dtype=np.float64)
+
+
+def day_bounds(codes, n_days):
+
+    # rows of each day in an array ordered by day
+    return np.searchsorted(codes, np.arange(n_days+1))
+
+
+def daily_summary(df_transactions):
+    """
+    This function computes the daily summary of the updated transactions of many days at once: each family of
+    metrics is derived for all the days from the same arrays, selected once per outcome
+
+    Two steps still loop over the days in Python, both to write the csv of daily_summary_loop byte for byte: the
+    sums of each day, whose numpy pairwise summation a grouped sum or np.add.reduceat over all the days does not
+    reproduce to the last digit, and the 'Hours Count' and 'Hours Match Count' dictionaries, whose key order in
+    the csv is the tie order of value_counts. Their cost grows with the number of days, not of contracts
+
+    Args:
+        df_transactions: updated transactions with the delivery day of each row in the 'day' column (Pandas DataFrame)
+    Return:
+        df_summary: one row of prices, volumes, revenues, contract counts and hourly counts per day (Pandas DataFrame)
+
+    """
+
+    df = df_transactions.sort_values('day', kind='mergesort')
+    codes, days = pd.factorize(df['day'], sort=True)
+    n_days = len(days)
+
+    execution_price = df['Execution Price'].to_numpy(dtype=np.float64)
+    a_posteriori_price = df['A posteriori Execution Price'].to_numpy(
+        dtype=np.float64)
+    volume = df['Executed Volume'].to_numpy(dtype=np.float64)
+    selling = df['match_binary_outcome_selling'].to_numpy() == 1
+    pumping = df['match_binary_outcome_pumping'].to_numpy() == 1
+    hours = df['Delivery Start'].dt.hour.to_numpy()
+
+    bounds = day_bounds(codes, n_days)
+    n_contracts = np.diff(bounds)
+
+    summary = {'time': days}
+
+    # prices
+    summary['Avg Historical Price'] = segment_sum(
+        execution_price, bounds)/n_contracts
+    summary['Max Historical Price'] = np.maximum.reduceat(
+        execution_price, bounds[:-1])
+    summary['Avg a Posteriori Price'] = segment_sum(
+        a_posteriori_price, bounds)/n_contracts
+    summary['Max a Posteriori Price'] = np.maximum.reduceat(
+        a_posteriori_price, bounds[:-1])
+
+    # prices of each flow, a posteriori where matched listed first and historical otherwise
+    for flow, matched in [('CH-DE', selling), ('DE-CH', pumping)]:
+        order = np.lexsort((~matched, codes))
+        flow_price = np.where(matched, a_posteriori_price,
+                              execution_price)[order]
+        summary[f'Avg a Posteriori Price {flow}'] = segment_sum(
+            flow_price, bounds)/n_contracts
+        summary[f'Max a Posteriori Price {flow}'] = np.maximum.reduceat(
+            flow_price, bounds[:-1])
+
+    # volumes, revenues and contracts of each flow
+    summary['Total Volume Traded'] = segment_sum(volume, bounds)
+    matched_bounds = {}
+    for flow, matched in [('CH-DE', selling), ('DE-CH', pumping)]:
+        matched_bounds[flow] = day_bounds(codes[matched], n_days)
+        summary[f'Total Volume Traded {flow}'] = segment_sum(
+            volume[matched], matched_bounds[flow])
+
+    for flow, matched in [('CH-DE', selling), ('DE-CH', pumping)]:
+        # the concept of maximum and minimum for revenue corresponding to the two flow is always from the swiss perspective
+        summary[f'{flow} Revenue Max'] = segment_sum(
+            volume[matched]*execution_price[matched], matched_bounds[flow])
+        summary[f'{flow} Revenue Min'] = segment_sum(
+            volume[matched]*a_posteriori_price[matched], matched_bounds[flow])
+
+    summary['Number of Contracts Closed'] = n_contracts
+    for flow in ['CH-DE', 'DE-CH']:
+        summary[f'{flow} Additional Contracts Closed'] = np.diff(
+            matched_bounds[flow])
+
+    # contracts per hour
+    matched_any = selling | pumping
+    matched_any_bounds = day_bounds(codes[matched_any], n_days)
+    hours_matched_any = hours[matched_any]
+    summary['Hours Count'] = [pd.Series(hours[start:end]).value_counts().to_dict()
+                              for start, end in zip(bounds[:-1], bounds[1:])]
+    summary['Hours Match Count'] = [pd.Series(hours_matched_any[start:end]).value_counts().to_dict()
+                                    for start, end in zip(matched_any_bounds[:-1], matched_any_bounds[1:])]
+
+    # volume per hour of each flow, one aggregation over all the days and hours
+    for flow, matched in [('CH-DE', selling), ('DE-CH', pumping)]:
+        hours_volume = pd.Series(volume[matched]).groupby(
+            [codes[matched], hours[matched]]).sum()
+        day_volumes = [{} for _ in range(n_days)]
+        for (code, hour), value in hours_volume.items():
+            day_volumes[code][hour] = value
+        summary[f'Hours Volume {flow}'] = day_volumes
+
+    return pd.DataFrame(data=summary)
+
+
+def hourly_rollup(df_transactions):
+    """
+    This function rolls the updated transactions up per day, delivery hour and flow direction, the long format
+    version of the hourly dictionaries of the summary
+
+    Args:
+        df_transactions: updated transactions with the delivery day of each row in the 'day' column (Pandas DataFrame)
+    Return:
+        df_rollup: one row per day, hour and direction with every hour of the day, counting the contracts closed,
+            the contracts matched in any direction, the contracts matched in the direction and their volume (Pandas DataFrame)
+
+    """
+
+    codes, days = pd.factorize(df_transactions['day'], sort=True)
+    n_slots = len(days)*24
+
+    # one slot per day and delivery hour
+    slot = codes*24 + \
+        pd.to_datetime(df_transactions['Delivery Start'],
+                       utc=True).dt.hour.to_numpy()
+    volume = df_transactions['Executed Volume'].to_numpy(dtype=np.float64)
+    matched = {direction: df_transactions[col].to_numpy() == 1
+               for direction, col in DIRECTIONS.items()}
+    matched_any = matched['CH-DE'] | matched['DE-CH']
+
+    frames = []
+    for direction in DIRECTIONS:
+
+        # grouped sums as in the hourly volume dictionaries of the summary
+        hours_volume = pd.Series(volume[matched[direction]]).groupby(
+            slot[matched[direction]]).sum()
+
+        frames.append(pd.DataFrame(data={
+            'day': np.repeat(days.to_numpy(), 24),
+            'hour': np.tile(np.arange(24, dtype=np.int8), len(days)),
+            'direction': direction,
+            'Contracts Closed': np.bincount(slot, minlength=n_slots),
+            'Contracts Matched Any Direction': np.bincount(slot[matched_any], minlength=n_slots),
+            'Contracts Matched': np.bincount(slot[matched[direction]], minlength=n_slots),
+            'Volume Matched': hours_volume.reindex(range(n_slots), fill_value=0.0).to_numpy()
+        }))
+
+    return typed_rollup(pd.concat(frames, ignore_index=True))
+
+
+def typed_rollup(df_rollup):
+
+    # ordered by day, hour and direction with the directions as categories
+    df_rollup['direction'] = pd.Categorical(
+        df_rollup['direction'], categories=list(DIRECTIONS))
+
+    return df_rollup.sort_values(['day', 'hour', 'direction'], kind='mergesort').reset_index(drop=True)
+
+
+def write_hourly_rollup(df_rollup, rollup_path):
+
+    # written to a temporary file first so that an interrupted write never leaves a truncated table
+    tmp_rollup_path = str(rollup_path)+'.tmp'
+    df_rollup.to_parquet(tmp_rollup_path, index=False)
+    os.replace(tmp_rollup_path, rollup_path)
+
+
+def load_hourly_rollup(summary_folder, months=None, hours=None, direction=None):
+    """
+    This function loads the hourly rollup of a summary folder, optionally sliced by month, hour and direction
+
+    Args:
+        summary_folder: folder of the summary csv and its hourly rollup (string or pathlib.Path)
+        months: month numbers to keep, None to keep every month (list)
+        hours: delivery hours to keep, None to keep every hour (list)
+        direction: 'CH-DE' or 'DE-CH', None to keep both directions (string)
+    Return:
+        df_rollup: rows of the hourly rollup in the slice (Pandas DataFrame)
+
+    """
+
+    df_rollup = pd.read_parquet(
+        pathlib.Path(summary_folder) / HOURLY_ROLLUP_NAME)
+
+    mask = np.ones(df_rollup.shape[0], dtype=bool)
+    if months is not None:
+        mask &= df_rollup['day'].dt.month.isin(months).to_numpy()
+    if hours is not None:
+        mask &= df_rollup['hour'].isin(hours).to_numpy()
+    if direction is not None:
+        mask &= (df_rollup['direction'] == direction).to_numpy()
+
+    return df_rollup[mask].reset_index(drop=True)
+
+
+def summary_as_text(df_summary):
+
+    # summary rows exactly as written in the summary csv, so that stored rows are merged without being parsed
+    buffer = io.StringIO()
+    df_summary.to_csv(buffer, index=False)
+    buffer.seek(0)
+
+    return pd.read_csv(buffer, dtype=str, keep_default_na=False)
+
+
+def write_summary_manifest(manifest, manifest_path):
+
+    tmp_manifest_path = str(manifest_path)+'.tmp'
+    with open(tmp_manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_manifest_path, manifest_path)
+
+
+def summarized_days(manifest, to_update):
+    """
+    This function lists the daily file of every day of the summary, the files being updated replacing the
+    summarized files of the same day
+
+    Args:
+        manifest: summarized daily files with their delivery day (dict)
+        to_update: delivery day and location of the new or changed daily files (list)
+    Return:
+        paths: delivery day and location of the daily file of every day, ordered by day (list)
+
+    """
+
+    files = {pd.Timestamp(entry['day']): path for path,
+             entry in manifest.items()}
+    files.update(dict(to_update))
+
+    missing = [path for path in files.values() if not os.path.isfile(path)]
+    if missing:
+        raise ValueError(
+            f'The hourly rollup cannot be rebuilt, the summarized daily files {missing} are missing. Run a full summary instead')
+
+    return sorted(files.items())
+
+
+def incremental_summary(folder_root_path, summary_path, manifest_path, rollup_path=None):
+    """
+    This function updates an existing summary csv with the days of a pipeline run which are new or changed
+    since the last update, according to a manifest of the summarized daily files with their size, modification
+    time and checksum. The days of summarized files deleted since are dropped from the summary and the rollup
+
+    Args:
+        folder_root_path: processed folder of the pipeline run to add to the summary (string)
+        summary_path: summary csv to update, created if missing (pathlib.Path)
+        manifest_path: json manifest of the summarized daily files, created if missing (pathlib.Path)
+        rollup_path: hourly rollup to update alongside the summary, rebuilt from every summarized day if
+            missing (pathlib.Path)
+    Return:
+        updated_days: delivery days whose summary row was computed (list)
+
+    """
+
+    manifest = {}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    # daily files never summarized or changed since the last update, only the files whose size or modification
+    # time differ from the manifest are read to compare their checksum
+    to_update = []
+    signatures = {}
+    for day, path in day_paths(folder_root_path, stage='Updated Transactions'):
+
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = manifest.get(path)
+        if entry is not None and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+            continue
+
+        signatures[path] = {'day': day.strftime('%Y-%m-%d'), 'size': stat.st_size,
+                            'mtime_ns': stat.st_mtime_ns, 'checksum': file_checksum(path)}
+        if entry is None or entry['checksum'] != signatures[path]['checksum']:
+            to_update.append((day, path))
+
+    # daily files deleted since the last update, their days leave the summary and the rollup unless another
+    # summarized file or a file being updated still holds them
+    removed = {path: manifest.pop(path)
+               for path in list(manifest) if not os.path.isfile(path)}
+    kept_days = {entry['day'] for entry in manifest.values()} | {
+        day.strftime('%Y-%m-%d') for day, _ in to_update}
+    removed_days = sorted({entry['day']
+                           for entry in removed.values()} - kept_days)
+
+    # a missing rollup, e.g. of a summary written before the rollup or deleted since, is rebuilt from every summarized day
+    rebuild_rollup = rollup_path is not None and not os.path.isfile(
+        rollup_path) and len(manifest) > 0
+
+    if not to_update and not rebuild_rollup and not removed:
+        # files touched without being changed are recorded with their new modification time
+        if signatures:
+            manifest.update(signatures)
+            write_summary_manifest(manifest, manifest_path)
+        return []
+
+    if to_update:
+        df_transactions = read_day_files(to_update, columns=SUMMARY_COLUMNS)
+        df_transactions['Delivery Start'] = pd.to_datetime(
+            df_transactions['Delivery Start'], utc=True)
+        df_new = summary_as_text(daily_summary(df_transactions))
+    else:
+        df_new = None
+
+    if to_update or removed_days:
+        # the new rows replace the stored rows of the same days, the rows of the removed days are dropped
+        frames = [] if df_new is None else [df_new]
+        if os.path.isfile(summary_path):
+            df_summary = pd.read_csv(
+                summary_path, dtype=str, keep_default_na=False)
+            dropped = df_summary['time'].isin(removed_days)
+            if df_new is not None:
+                dropped |= df_summary['time'].isin(df_new['time'])
+            frames.insert(0, df_summary[~dropped])
+
+        df_summary = pd.concat(frames, ignore_index=True).sort_values(
+            'time', kind='mergesort') if frames else None
+
+    if rebuild_rollup:
+        df_rollup = hourly_rollup(read_day_files(
+            summarized_days(manifest, to_update), columns=SUMMARY_COLUMNS))
+    elif rollup_path is not None:
+        frames = [hourly_rollup(df_transactions)] if to_update else []
+        if os.path.isfile(rollup_path):
+            df_rollup_stored = pd.read_parquet(rollup_path)
+            dropped = df_rollup_stored['day'].isin(
+                pd.to_datetime(removed_days))
+            if to_update:
+                dropped |= df_rollup_stored['day'].isin(frames[0]['day'])
+            frames.insert(0, df_rollup_stored[~dropped])
+        df_rollup = typed_rollup(pd.concat(
+            frames, ignore_index=True)) if frames else None
+
+    # the manifest is only written once the summary is, an interrupted update is done again
+    if (to_update or removed_days) and df_summary is not None:
+        tmp_summary_path = str(summary_path)+'.tmp'
+        df_summary.to_csv(tmp_summary_path, index=False)
+        os.replace(tmp_summary_path, summary_path)
+
+    if rollup_path is not None and df_rollup is not None:
+        write_hourly_rollup(df_rollup, rollup_path)
+
+    manifest.update(signatures)
+    write_summary_manifest(manifest, manifest_path)
+
+    return [day for day, _ in to_update]
+
+
+def daily_summary_loop(df_transactions):
+    """
+    This function is the day by day version of daily_summary, kept as reference for its output
+
+    Args:
+        df_transactions: updated transactions with the delivery day of each row in the 'day' column (Pandas DataFrame)
+    Return:
+        df_summary: one row of prices, volumes, revenues, contract counts and hourly counts per day (Pandas DataFrame)
+
+    """
+
+    # set monthly quantities
+    times = []
+    avg_price_base = []
+    max_price_base = []
+    avg_price_update = []
+    max_price_update = []
+    avg_price_update_ch_de = []
+    max_price_update_ch_de = []
+    avg_price_update_de_ch = []
+    max_price_update_de_ch = []
+
+    volume_traded = []
+    volume_traded_CH_DE = []
+    volume_traded_DE_CH = []
+    revenue_max_CH_DE = []
+    revenue_min_CH_DE = []
+    revenue_max_DE_CH = []
+    revenue_min_DE_CH = []
+    contracts_closed_window = []
+    contracts_closed_window_addition_CH_DE = []
+    contracts_closed_window_addition_DE_CH = []
+    hours_counts = []
+    hours_counts_match = []
+
+    hours_volume_CH_DE = []
+    hours_volume_DE_CH = []
+
+    for day, df in df_transactions.groupby('day', sort=True):
+
+        # get day
+        times.append(pd.Timestamp(day))
+
+        # prices
+        avg_price_base.append(df['Execution Price'].mean())
+        max_price_base.append(df['Execution Price'].max())
+
+        selling_p = df[df['match_binary_outcome_selling'] == 1]['A posteriori Execution Price'].values.tolist(
+        )+df[df['match_binary_outcome_selling'] != 1]['Execution Price'].values.tolist()
+
+        pumping_p = df[df['match_binary_outcome_pumping'] == 1]['A posteriori Execution Price'].values.tolist(
+        )+df[df['match_binary_outcome_pumping'] != 1]['Execution Price'].values.tolist()
+
+        avg_price_update_ch_de.append(np.mean(selling_p))
+        max_price_update_ch_de.append(np.max(selling_p))
+
+        avg_price_update_de_ch.append(np.mean(pumping_p))
+        max_price_update_de_ch.append(np.max(pumping_p))
+
+        avg_price_update.append(df['A posteriori Execution Price'].mean())
+        max_price_update.append(df['A posteriori Execution Price'].max())
+
+        # volumes
+        volume_traded.append(df['Executed Volume'].sum())
+        volume_traded_CH_DE.append(
+            df[df['match_binary_outcome_selling'] == 1]['Executed Volume'].sum())
+        volume_traded_DE_CH.append(
+            df[df['match_binary_outcome_pumping'] == 1]['Executed Volume'].sum())
+
+        vol_add_CH_DE = df[df['match_binary_outcome_selling']
+                           == 1]['Executed Volume']
+        vol_add_DE_CH = df[df['match_binary_outcome_pumping']
+                           == 1]['Executed Volume']
+
+        # revenues
+        pri_add_CH_DE = df[df['match_binary_outcome_selling']
+                           == 1]['Execution Price']
+        pri_add_DE_CH = df[df['match_binary_outcome_pumping']
+                           == 1]['Execution Price']
+
+        pri_marg_CH_DE = df[df['match_binary_outcome_selling']
+                            == 1]['A posteriori Execution Price']
+        pri_marg_DE_CH = df[df['match_binary_outcome_pumping']
+                            == 1]['A posteriori Execution Price']
+
+        # the concept of maximum and minimum for revenue corresponding to the two flow is always from the swiss perspective
+        rev_max_CH_DE = vol_add_CH_DE*pri_add_CH_DE
+        rev_min_CH_DE = vol_add_CH_DE*pri_marg_CH_DE
+        revenue_max_CH_DE.append(rev_max_CH_DE.sum())
+        revenue_min_CH_DE.append(rev_min_CH_DE.sum())
+
+        rev_max_DE_CH = vol_add_DE_CH*pri_add_DE_CH
+        rev_min_DE_CH = vol_add_DE_CH*pri_marg_DE_CH
+        revenue_max_DE_CH.append(rev_max_DE_CH.sum())
+        revenue_min_DE_CH.append(rev_min_DE_CH.sum())
+
+        # n contracts closed
+        contracts_closed_window.append(df.shape[0])
+        contracts_closed_window_addition_CH_DE.append(
+            df[df['match_binary_outcome_selling'] == 1].shape[0])
+        contracts_closed_window_addition_DE_CH.append(
+            df[df['match_binary_outcome_pumping'] == 1].shape[0])
+
+        # contracts per hour
+        hours_count = pd.to_datetime(df['Delivery Start']
+                                     ).dt.hour.value_counts().to_dict()
+
+        hours_count_match = pd.to_datetime(df['Delivery Start']
+                                           [(df['match_binary_outcome_selling'] == 1) | (df['match_binary_outcome_pumping'] == 1)]).dt.hour.value_counts().to_dict()
+
+        hours_counts.append(hours_count)
+        hours_counts_match.append(hours_count_match)
+
+        time_dev_start = pd.to_datetime(df['Delivery Start'])
+        CH_DE_volume_hour = dict(df[df['match_binary_outcome_selling'] == 1].groupby(
+            time_dev_start.dt.hour)['Executed Volume'].sum())
+
+        DE_CH_volume_hour = dict(df[df['match_binary_outcome_pumping'] == 1].groupby(
+            time_dev_start.dt.hour)['Executed Volume'].sum())
+
+        hours_volume_CH_DE.append(CH_DE_volume_hour)
+        hours_volume_DE_CH.append(DE_CH_volume_hour)
+
+    df_summary = pd.DataFrame(
+        data={
+            'time': times,
+            'Avg Historical Price': avg_price_base,
+            'Max Historical Price': max_price_base,
+            'Avg a Posteriori Price': avg_price_update,
+            'Max a Posteriori Price': max_price_update,
+            'Avg a Posteriori Price CH-DE': avg_price_update_ch_de,
+            'Max a Posteriori Price CH-DE': max_price_update_ch_de,
+            'Avg a Posteriori Price DE-CH': avg_price_update_de_ch,
+            'Max a Posteriori Price DE-CH': max_price_update_de_ch,
+            'Total Volume Traded': volume_traded,
+            'Total Volume Traded CH-DE': volume_traded_CH_DE,
+            'Total Volume Traded DE-CH': volume_traded_DE_CH,
+            'CH-DE Revenue Max': revenue_max_CH_DE,
+            'CH-DE Revenue Min': revenue_min_CH_DE,
+            'DE-CH Revenue Max': revenue_max_DE_CH,
+            'DE-CH Revenue Min': revenue_min_DE_CH,
+            'Number of Contracts Closed': contracts_closed_window,
+            'CH-DE Additional Contracts Closed': contracts_closed_window_addition_CH_DE,
+            'DE-CH Additional Contracts Closed': contracts_closed_window_addition_DE_CH,
+            'Hours Count': hours_counts,
+            'Hours Match Count': hours_counts_match,
+            'Hours Volume CH-DE': hours_volume_CH_DE,
+            'Hours Volume DE-CH': hours_volume_DE_CH
+
+        }
+    )
+
+    return df_summary
@@ -0,0 +1,374 @@
+import os
+import pathlib
+import pandas as pd
+import numpy as np
+
+
+# instrument types with their duration in minutes and their share among the orders of a day
+INSTRUMENT_TYPES = {'Hour': 60, 'Half Hour': 30, 'Quarter Hour': 15}
+INSTRUMENT_TYPES_SHARE = [0.35, 0.05, 0.6]
+
+# columns of the EPEX LOB files in the order they appear in the raw csv
+EPEX_COLUMNS = ['Order ID', 'Initial ID', 'Parent ID', 'Start Validity Date', 'End Validity Date', 'Cancelling Date',
+                'Delivery Date', 'Instrument Type', 'Delivery Instrument', 'Is block', 'Area', 'Side', 'Price',
+                'Volume', 'Is Executed', 'Execution Price', 'Executed Volume']
+
+AREAS = ['DE-50Hz', 'DE-AMP', 'DE-TPS', 'DE-TTG']
+
+
+def format_epex_timestamp(timestamps):
+    """
+    This function formats a series of timestamps in the format used by the EPEX LOB files
+
+    Args:
+        timestamps: timestamps to format (Pandas Series)
+    Return:
+        formatted: timestamps as '%d/%m/%Y %H:%M:%S.%f' strings, empty where missing (Pandas Series)
+
+    """
+
+    formatted = timestamps.dt.strftime('%d/%m/%Y %H:%M:%S.%f').str[:-3]
+
+    return formatted.fillna('')
+
+
+def generate_epex_day(day, n_rows=100000, executed_share=0.1, unbalanced_share=0.0, seed=0):
+    """
+    This function generates a synthetic EPEX LOB day with the same structure of the raw EPEX 2019 files.
+    Executed orders are generated in buy/sell pairs sharing time, price, volume and delivery, while the
+    remaining rows are non executed orders
+
+    Args:
+        day: delivery day of the file (string or pd.Timestamp)
+        n_rows: number of rows of the LOB (int)
+        executed_share: share of rows which are executed orders (float)
+        unbalanced_share: share of the buy/sell pairs which cannot be paired back, half of them executed at
+            different end validity dates and half of them on the same side (float)
+        seed: seed of the random generator (int)
+    Return:
+        df: synthetic LOB with raw columns and formats (Pandas DataFrame)
+
+    """
+
+    rng = np.random.default_rng(seed)
+    day = pd.Timestamp(day, tz='UTC')
+
+    n_trades = int(n_rows*executed_share/2)
+    n_orders = n_rows-2*n_trades
+
+    # one delivery product per trade and per non executed order
+    n_products = n_trades+n_orders
+    instrument_type = rng.choice(
+        list(INSTRUMENT_TYPES.keys()), size=n_products, p=INSTRUMENT_TYPES_SHARE)
+    duration = pd.Series(instrument_type).map(INSTRUMENT_TYPES).values
+    n_slots = 24*60//duration
+    delivery_end = (rng.integers(0, n_slots)+1)*duration
+    delivery_start = day+pd.to_timedelta(delivery_end-duration, unit='min')
+
+    # lead time of the orders to delivery start, up to five hours
+    lead_time = pd.to_timedelta(rng.integers(
+        0, 5*60*60*1000, size=n_products), unit='ms')
+    end_validity = delivery_start-lead_time
+
+    price = np.round(rng.normal(45, 15, size=n_products), 2)
+    volume = np.round(rng.integers(1, 200, size=n_products)*0.1, 1)
+
+    # duplicate trade products on both sides and append non executed orders
+    product_index = np.concatenate(
+        [np.repeat(np.arange(n_trades), 2), np.arange(n_trades, n_products)])
+    side = np.concatenate([np.tile(['B', 'S'], n_trades),
+                           rng.choice(['B', 'S'], size=n_orders)])
+    is_executed = np.concatenate(
+        [np.ones(2*n_trades, dtype=int), np.zeros(n_orders, dtype=int)])
+
+    end_validity = pd.Series(end_validity[product_index])
+    start_validity = end_validity - \
+        pd.to_timedelta(rng.integers(0, 600000, size=n_rows), unit='ms')
+    cancelling = end_validity.where(
+        (is_executed == 0) & (rng.random(n_rows) < 0.8))
+
+    execution_price = np.where(is_executed == 1, price[product_index], np.nan)
+    executed_volume = np.where(
+        is_executed == 1, volume[product_index], 0.0)
+    order_price = np.where(side == 'B', 1, -1) * \
+        np.round(rng.exponential(2, size=n_rows), 2)+price[product_index]
+
+    order_id = 10500000000+np.arange(n_rows)
+    df = pd.DataFrame({
+        'Order ID': order_id,
+        'Initial ID': order_id,
+        'Parent ID': np.nan,
+        'Start Validity Date': format_epex_timestamp(start_validity),
+        'End Validity Date': format_epex_timestamp(end_validity),
+        'Cancelling Date': format_epex_timestamp(cancelling),
+        'Delivery Date': day.strftime('%d/%m/%Y'),
+        'Instrument Type': instrument_type[product_index],
+        'Delivery Instrument': [f'{m//60:02d}:{m % 60:02d}' for m in delivery_end[product_index]],
+        'Is block': 'N',
+        'Area': rng.choice(AREAS, size=n_rows),
+        'Side': side,
+        'Price': order_price,
+        'Volume': volume[product_index],
+        'Is Executed': is_executed,
+        'Execution Price': execution_price,
+        'Executed Volume': executed_volume,
+    }, columns=EPEX_COLUMNS)
+
+    # unbalanced end validity dates, dropped by the transaction derivation
+    n_unbalanced = int(n_trades*unbalanced_share)
+    if n_unbalanced > 0:
+        sell_rows = 2*rng.choice(n_trades, size=n_unbalanced, replace=False)+1
+        shifted, same_side = sell_rows[:n_unbalanced//2], sell_rows[n_unbalanced//2:]
+
+        df.loc[shifted, 'End Validity Date'] = format_epex_timestamp(
+            end_validity[shifted]+pd.to_timedelta(rng.integers(1, 1000, size=len(shifted)), unit='ms')).values
+        df.loc[same_side, 'Side'] = 'B'
+
+    # raw files are ordered by validity
+    df = df.iloc[np.argsort(start_validity.values, kind='stable')]
+
+    return df.reset_index(drop=True)
+
+
+def write_epex_day(df, folder_root_path, day):
+    """
+    This function writes a synthetic LOB day with the folder and file naming of the raw EPEX 2019 dump
+
+    Args:
+        df: synthetic LOB (Pandas DataFrame)
+        folder_root_path: root folder of the EPEX files (string or pathlib.Path)
+        day: delivery day of the file (string or pd.Timestamp)
+    Return:
+        path: location of the written file (pathlib.Path)
+
+    """
+
+    day = pd.Timestamp(day)
+    folder = pathlib.Path(folder_root_path) / \
+        f'DE Continuous Orders {day.strftime("%Y-%m")}'
+    os.makedirs(folder, exist_ok=True)
+    path = folder / f'DE Continuous Orders {day.strftime("%Y%m%d")}.csv'
+
+    # the raw files end every line with the separator, which is read back as 'Unnamed: 17'
+    df.assign(**{'': ''}).to_csv(path, sep=';', decimal=',', index=False)
+
+    return path
+
+
+def generate_weekly_prices(year=2019, seed=0):
+    """
+    This function generates the weekly hydro prices of a year with the structure of the Swiss hydro price file
+
+    Args:
+        year: year of the prices (int)
+        seed: seed of the random generator (int)
+    Return:
+        df: one row per week ending on sunday, the last one ending at new year (Pandas DataFrame)
+
+    """
+
+    rng = np.random.default_rng(seed)
+
+    end_date = pd.date_range(f'{year}-01-01', periods=52, freq='W-SUN').append(
+        pd.DatetimeIndex([f'{year+1}-01-01']))
+    average_price = np.round(rng.uniform(35, 70, size=len(end_date)), 2)
+
+    return pd.DataFrame({'End Date': end_date.strftime('%d/%m/%Y %H:%M'),
+                         '': np.arange(1, len(end_date)+1),
+                         'Average Weekly Price [Euro/MWh]': average_price,
+                         'Max Weekly Pumping Price [Euro/MWh]': np.round(0.8*average_price, 2)})
+
+
+def generate_NTC(year=2019, seed=0):
+    """
+    This function generates the quarter hourly NTC between Germany and Switzerland of a year, with hourly
+    constant capacities, with the structure of the NTC file
+
+    Args:
+        year: year of the NTC (int)
+        seed: seed of the random generator (int)
+    Return:
+        df: one row per quarter hour (Pandas DataFrame)
+
+    """
+
+    rng = np.random.default_rng(seed)
+
+    start_time = pd.date_range(
+        f'{year}-01-01', f'{year+1}-01-01', freq='15min')[:-1]
+    n_hours = len(start_time)//4
+
+    return pd.DataFrame({'Date from': start_time.strftime('%d.%m.%Y'),
+                         'Time from': start_time.strftime('%H:%M'),
+                         'Time to': (start_time+pd.Timedelta(15, unit='minutes')).strftime('%H:%M'),
+                         'CH to DE_Utilized capacity (MW)': 0,
+                         'CH to DE_Actual value (MW)': np.repeat(rng.integers(0, 300, size=n_hours), 4),
+                         'De to CH_Utilized capacity (MW)': 0,
+                         'DE to CH_Actual value (MW)': np.repeat(rng.integers(0, 300, size=n_hours), 4),
+                         'Intraday has taken place': 'Yes'})
+
+
+def generate_power_limit(year=2019, seed=0):
+    """
+    This function generates the hourly Swiss hydro generation and its up and downscale potential of a year,
+    with the structure of the power limit file
+
+    Args:
+        year: year of the power limit (int)
+        seed: seed of the random generator (int)
+    Return:
+        df: one row per hour, up to the first hour of the next year (Pandas DataFrame)
+
+    """
+
+    rng = np.random.default_rng(seed)
+
+    value_time = pd.date_range(f'{year}-01-01', f'{year+1}-01-01', freq='H')
+
+    return pd.DataFrame({'VALUE_TIME': value_time.strftime('%d.%m.%Y %H:%M'),
+                         'Max. von Generation [MWh]': rng.integers(3000, 6000, size=len(value_time)),
+                         'Min. von Generation [MWh]': rng.integers(0, 500, size=len(value_time)),
+                         'Upscale Potential [MWh]': rng.integers(0, 400, size=len(value_time)),
+                         'Donwnscale Potential': rng.integers(0, 300, size=len(value_time))})
+
+
+def write_static_data(folder, year=2019, seed=0):
+    """
+    This function writes synthetic weekly prices, NTC and power limit files with the names and formats of
+    the static data read by the complete pipeline
+
+    Args:
+        folder: folder of the static data (string or pathlib.Path)
+        year: year of the data (int)
+        seed: seed of the random generator (int)
+    Return:
+        paths: locations of the weekly prices, NTC and power limit files (list)
+
+    """
+
+    folder = pathlib.Path(folder)
+    os.makedirs(folder, exist_ok=True)
+
+    paths = [folder / f'Hydro Generation and Price_CH_{year}.csv',
+             folder / f'NTC_DEandCH_{year}.csv',
+             folder / f'Hydro Generation up- downscale Potential_CH_{year}.csv']
+
+    generate_weekly_prices(year, seed).to_csv(
+        paths[0], sep=';', decimal=',', index=False, encoding='ISO-8859-1')
+    generate_NTC(year, seed).to_csv(paths[1], index=False)
+    generate_power_limit(year, seed).to_csv(paths[2], sep=';', index=False)
+
+    return paths
+
+
+def write_synthetic_dataset(folder, days, n_rows=100000, executed_share=0.1, unbalanced_share=0.001, seed=0):
+    """
+    This function writes a synthetic external data folder: the static data and the EPEX LOB files of the
+    given days in the EPEX_spot_continous_<year> folder, as expected by the complete pipeline
+
+    Args:
+        folder: external data folder (string or pathlib.Path)
+        days: delivery days of the LOB files, all in the same year (list)
+        n_rows: number of rows of each LOB file (int)
+        executed_share: share of rows which are executed orders (float)
+        unbalanced_share: share of the buy/sell pairs which cannot be paired back (float)
+        seed: seed of the random generator, each day uses its own offset (int)
+    Return:
+        folder_root_path: folder of the EPEX LOB files (pathlib.Path)
+
+    """
+
+    year = pd.Timestamp(days[0]).year
+    write_static_data(folder, year=year, seed=seed)
+
+    folder_root_path = pathlib.Path(folder) / f'EPEX_spot_continous_{year}'
+    for i, day in enumerate(days):
+        write_epex_day(generate_epex_day(day, n_rows=n_rows, executed_share=executed_share,
+                                         unbalanced_share=unbalanced_share, seed=seed+i), folder_root_path, day)
+
+    return folder_root_path
+
+
+def format_alpiq_time(timestamps):
+    """
+    This function formats a series of timestamps as in the ALPIQ transactions files, without leading zeros and
+    with the hour left out at midnight
+
+    Args:
+        timestamps: timestamps to format (Pandas Series)
+    Return:
+        formatted: timestamps as '%m/%d/%y %H:%M' strings or '%m/%d/%y' strings at midnight (Pandas Series)
+
+    """
+
+    date = timestamps.dt.month.astype(str)+'/' + \
+        timestamps.dt.day.astype(str)+'/'+timestamps.dt.strftime('%y')
+    hour = ' '+timestamps.dt.hour.astype(str)+':' + \
+        timestamps.dt.strftime('%M')
+    midnight = (timestamps.dt.hour == 0) & (timestamps.dt.minute == 0)
+
+    return date+hour.where(~midnight, '')
+
+
+def generate_alpiq_month(month, n_rows=500000, seed=0):
+    """
+    This function generates a synthetic month of ALPIQ transactions with the columns and time formats of the
+    ID_GDM files: delivery start and end, trade timestamp, duration in hours, price and volume
+
+    Args:
+        month: first day of the month of delivery (string or pd.Timestamp)
+        n_rows: number of transactions (int)
+        seed: seed of the random generator (int)
+    Return:
+        df: synthetic transactions with raw columns and formats (Pandas DataFrame)
+
+    """
+
+    rng = np.random.default_rng(seed)
+    month = pd.Timestamp(month)
+    n_days = month.days_in_month
+
+    duration = rng.choice([0.25, 0.5, 1], size=n_rows,
+                          p=INSTRUMENT_TYPES_SHARE[::-1])
+    slot_minutes = (duration*60).astype(int)
+
+    # delivery aligned on the duration of the contract, traded up to five hours before in whole minutes
+    slot = rng.integers(0, n_days*24*60//slot_minutes)
+    from_time = pd.Series(
+        month+pd.to_timedelta(slot*slot_minutes, unit='min'))
+    to_time = from_time+pd.to_timedelta(slot_minutes, unit='min')
+    timestamp = from_time - \
+        pd.to_timedelta(rng.integers(0, 5*60, size=n_rows), unit='min')
+
+    df = pd.DataFrame({'TIMESTAMP': format_alpiq_time(timestamp),
+                       'FROM_TIME': format_alpiq_time(from_time),
+                       'TO_TIME': format_alpiq_time(to_time),
+                       'DURATION': duration,
+                       'PRICE': np.round(rng.normal(45, 15, size=n_rows), 2),
+                       'VOLUME': np.round(rng.integers(1, 200, size=n_rows)*0.1, 1)})
+
+    # files are ordered by trade time
+    return df.iloc[np.argsort(timestamp.values, kind='stable')].reset_index(drop=True)
+
+
+def write_alpiq_month(df, folder, month):
+    """
+    This function writes a synthetic month of ALPIQ transactions as an ID_GDM file named after the last day of the month
+
+    Args:
+        df: synthetic transactions (Pandas DataFrame)
+        folder: folder of the ALPIQ files (string or pathlib.Path)
+        month: first day of the month of delivery (string or pd.Timestamp)
+    Return:
+        path: location of the written file (pathlib.Path)
+
+    """
+
+    os.makedirs(folder, exist_ok=True)
+    month_end = pd.Timestamp(month)+pd.offsets.MonthEnd(0)
+    path = pathlib.Path(folder) / f'ID_GDM_{month_end.strftime("%Y%m%d")}.csv'
+
+    # the exported files end every line with a separator, which is read back as 'Unnamed: 6'
+    df.assign(**{'': ''}).to_csv(path, index=False)
+
+    return path
@@ -1,6 +1,10 @@
+import os
 import pandas as pd
 import numpy as np
 
+from src.data.matching_kernel import greedy_matching
+from src.data.static_bundle import read_bundle, write_bundle
+
 
 def clean_transactions(x):
 
@@ -10,7 +14,7 @@ def clean_transactions(x):
                  'End Validity Date_S',
                  'Executed Price & Volume_S',
                  'Delivery Start_S',
-                 'lead_time_S'], 1)
+                 'lead_time_S'], 1, errors='ignore')
     df.rename(columns={'Executed Volume_B': 'Executed Volume',
                        'Execution Price_B': 'Execution Price',
                        'Instrument Type_B': 'Instrument Type',
@@ -63,7 +67,64 @@ def read_NTC_file(path):
     return df
 
 
-def NTC_preparation(NTC):
+def split_time(col):
+    """
+    This function splits HH:MM strings into hours and minutes. The few distinct times of the day are split
+    once with the string accessor and taken back for every row
+
+    Args:
+        col: times of the day as HH:MM strings (Pandas Series)
+    Return:
+        hours: hours of every row (Pandas Series)
+        minutes: minutes of every row (Pandas Series)
+
+    """
+
+    codes, uniques = pd.factorize(col)
+    time_split = pd.Series(uniques).str.split(
+        ':', expand=True).astype('int64').to_numpy()
+
+    hours = pd.Series(time_split[codes, 0], index=col.index)
+    minutes = pd.Series(time_split[codes, 1], index=col.index)
+
+    return hours, minutes
+
+
+def NTC_preparation(NTC, vectorized=True):
+    """
+    This function derives the start and end time of every NTC slot and the columns storing its updated capacity
+
+    Args:
+        NTC: NTC dataframe as read by read_NTC_file (Pandas DataFrame)
+        vectorized: deciding whether to split the times on whole columns or row by row (bool)
+    Return:
+        NTC: prepared NTC dataframe (Pandas DataFrame)
+
+    """
+
+    if not vectorized:
+        return NTC_preparation_loop(NTC)
+
+    # START TIME
+    NTC['Time from hour'], NTC['Time from min'] = split_time(NTC['Time from'])
+    NTC['start_time'] = NTC['Date from']+pd.to_timedelta(
+        NTC['Time from hour'], unit='hours')+pd.to_timedelta(NTC['Time from min'], unit='minutes')
+
+    # END TIME, a slot ending at midnight ends at hour 24 of its day
+    hours_to, minutes_to = split_time(NTC['Time to'])
+    NTC['Time to hour'] = hours_to.where((hours_to != 0) | (minutes_to != 0), 24)
+    NTC['Time to min'] = minutes_to
+    NTC['end_time'] = NTC['Date from']+pd.to_timedelta(
+        NTC['Time to hour'], unit='hours')+pd.to_timedelta(NTC['Time to min'], unit='minutes')
+
+    # create a column to store update capacity
+    NTC['CH to DE_Actual value (MW) update'] = NTC['CH to DE_Actual value (MW)']
+    NTC['DE to CH_Actual value (MW) update'] = NTC['DE to CH_Actual value (MW)']
+
+    return NTC
+
+
+def NTC_preparation_loop(NTC):
 
     # START TIME
     NTC['Time from hour'] = NTC['Time from'].apply(
@@ -105,7 +166,58 @@ def read_pw_file(path):
     return df
 
 
-def pw_preparation(pw):
+# hourly values of the power limit file
+PW_VALUES = ['Max. von Generation [MWh]', 'Min. von Generation [MWh]',
+             'Upscale Potential [MWh]', 'Donwnscale Potential']
+
+
+def pw_preparation(pw, vectorized=True):
+    """
+    This function manipulates the "Power Limit" file to obtain the same structure of NTC: 15 minutes slots with
+    start and end time and the columns storing their updated capacity
+
+    Args:
+        pw: power limit dataframe as read by read_pw_file (Pandas DataFrame)
+        vectorized: deciding whether to resample the numeric columns directly or through lists of values,
+            which leaves them with object dtype (bool)
+    Return:
+        pw_resampled: prepared power limit dataframe (Pandas DataFrame)
+
+    """
+
+    if not vectorized:
+        return pw_preparation_loop(pw)
+
+    # from hourly to 15 minutes time resolution, keeping numeric values
+    pw_resampled = pw.set_index('VALUE_TIME')[PW_VALUES].astype('float64').sort_index(
+        kind='mergesort').resample('15T', convention='start').ffill()
+
+    # restore normal range index
+    pw_resampled = pw_resampled.reset_index()
+
+    # create column start_time and end_time for the optimizer
+    pw_resampled['start_time'] = pw_resampled['VALUE_TIME']
+    pw_resampled['end_time'] = pw_resampled['VALUE_TIME'] + \
+        pd.to_timedelta(15, unit='minutes')
+
+    # create a column to store update capacity
+    pw_resampled['Selling Actual value update [MW]'] = pw_resampled['Upscale Potential [MWh]']
+    pw_resampled['Pumping Actual value update [MW]'] = pw_resampled['Donwnscale Potential']
+
+    # drop unsued columns and rename columns with correct units
+    pw_resampled['Upscale Potential [MW]'] = pw_resampled['Upscale Potential [MWh]']
+    pw_resampled['Donwnscale Potential [MW]'] = pw_resampled['Donwnscale Potential']
+
+    pw_resampled.drop(columns=['Max. von Generation [MWh]',
+                               'Min. von Generation [MWh]',
+                               'Donwnscale Potential',
+                               'Upscale Potential [MWh]'
+                               ], inplace=True)
+
+    return pw_resampled
+
+
+def pw_preparation_loop(pw):
     # manipulate "Power Limit" file to obtain the same structure of NTC
 
     # from hourly to 15 minutes time resolution
@@ -144,6 +256,396 @@ def pw_preparation(pw):
     return pw_resampled
 
 
+def static_sources(static_paths):
+
+    # the bundle is up to date as long as the static files keep their size and modification time
+    sources = []
+    for path in static_paths:
+        stat = os.stat(path)
+        sources.append({'name': os.path.basename(path),
+                       'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+
+    return sources
+
+
+def frame_to_arrays(df, name):
+    """
+    This function converts the columns of a dataframe into NumPy arrays which can be memory-mapped: dates are
+    stored as int64 nanoseconds and strings as fixed width unicode with a mask of the missing values
+
+    Args:
+        df: dataframe with a range index (Pandas DataFrame)
+        name: prefix of the array names (string)
+    Return:
+        arrays: arrays of the columns by name (dict)
+        columns: name, kind and time zone of every column (list)
+
+    """
+
+    arrays = {}
+    columns = []
+    for i, col in enumerate(df.columns):
+
+        values = df[col]
+        key = f'{name}/{i}'
+
+        if pd.api.types.is_datetime64_any_dtype(values):
+            tz = values.dt.tz
+            arrays[key] = values.values.view(np.int64)
+            columns.append([col, 'datetime', str(tz) if tz is not None else None])
+        elif values.dtype == object:
+            arrays[key] = values.fillna('').to_numpy(dtype=str)
+            arrays[key+'/isna'] = values.isna().to_numpy()
+            columns.append([col, 'string', None])
+        else:
+            arrays[key] = values.to_numpy()
+            columns.append([col, 'numeric', None])
+
+    return arrays, columns
+
+
+def arrays_to_frame(arrays, columns, name, writable=()):
+    """
+    This function builds back the dataframe stored by frame_to_arrays. The numeric and date columns are
+    read-only views of the arrays, only the string columns and the writable columns are copied
+
+    Args:
+        arrays: arrays of the columns by name, e.g. memory-mapped by read_bundle (dict)
+        columns: name, kind and time zone of every column (list)
+        name: prefix of the array names (string)
+        writable: columns copied out of the arrays so that they can be updated in place (list)
+    Return:
+        df: dataframe with a range index (Pandas DataFrame)
+
+    """
+
+    data = {}
+    for i, (col, kind, tz) in enumerate(columns):
+
+        values = np.asarray(arrays[f'{name}/{i}'])
+        if col in writable:
+            values = values.copy()
+
+        if kind == 'datetime':
+            data[col] = pd.arrays.DatetimeArray(values.view('M8[ns]'), dtype=pd.DatetimeTZDtype(
+                tz=tz) if tz is not None else None, copy=False)
+        elif kind == 'string':
+            data[col] = np.where(
+                arrays[f'{name}/{i}/isna'], np.nan, values.astype(object))
+        else:
+            data[col] = values
+
+    # the columns are not consolidated into new blocks, so that they stay views of the arrays
+    return pd.DataFrame(data, copy=False)
+
+
+def write_static_bundle(static_paths, bundle_path):
+    """
+    This function reads and prepares the weekly prices, NTC and power limit files once and writes the
+    prepared frames into a single binary bundle, so that the entry points memory-map them at startup instead
+    of parsing and preparing the csv files
+
+    Args:
+        static_paths: weekly prices, NTC and power limit files (list)
+        bundle_path: bundle file location path (string or pathlib.Path)
+
+    """
+
+    frames = {'wp': read_weekly_prices_file(static_paths[0]),
+              'NTC': NTC_preparation(read_NTC_file(static_paths[1])),
+              'pw': pw_preparation(read_pw_file(static_paths[2]))}
+
+    arrays = {}
+    metadata = {'sources': static_sources(static_paths), 'frames': {}}
+    for name, df in frames.items():
+        frame_arrays, columns = frame_to_arrays(df, name)
+        arrays.update(frame_arrays)
+        metadata['frames'][name] = columns
+
+    write_bundle(bundle_path, arrays, metadata)
+
+
+def read_static_bundle(bundle_path, static_paths=None):
+    """
+    This function loads the weekly prices, NTC and power limit frames from a bundle written by write_static_bundle.
+    The columns stay memory-mapped apart from the strings and the capacity update columns of the welfare model,
+    which are copied since the matching updates them in place
+
+    Args:
+        bundle_path: bundle file location path (string or pathlib.Path)
+        static_paths: weekly prices, NTC and power limit files the bundle has to be up to date with, not
+            checked when None (list)
+    Return:
+        wp: weekly prices dataframe as read by read_weekly_prices_file (Pandas DataFrame)
+        NTC: prepared NTC dataframe (Pandas DataFrame)
+        pw: prepared power limit dataframe (Pandas DataFrame)
+
+    """
+
+    arrays, metadata = read_bundle(bundle_path)
+
+    if static_paths is not None and metadata['sources'] != static_sources(static_paths):
+        raise ValueError(
+            f'The static data bundle {bundle_path} is outdated, build it again from {static_paths}')
+
+    # update columns of NTC and power limit holding the capacity state of the welfare model
+    writable = [col for cols in CapacityLedger.columns.values() for col in cols]
+
+    return tuple(arrays_to_frame(arrays, metadata['frames'][name], name, writable=writable) for name in ['wp', 'NTC', 'pw'])
+
+
+def load_static_data(static_paths, bundle_path=None):
+    """
+    This function loads the prepared static data from the bundle when it is up to date with the static files,
+    otherwise the csv files are parsed and prepared
+
+    Args:
+        static_paths: weekly prices, NTC and power limit files (list)
+        bundle_path: bundle file location path, the csv files are always read when None (string or pathlib.Path)
+    Return:
+        wp: weekly prices dataframe as read by read_weekly_prices_file (Pandas DataFrame)
+        NTC: prepared NTC dataframe (Pandas DataFrame)
+        pw: prepared power limit dataframe (Pandas DataFrame)
+
+    """
+
+    if bundle_path is not None and os.path.isfile(bundle_path):
+        try:
+            return read_static_bundle(bundle_path, static_paths=static_paths)
+        except ValueError as error:
+            print(f'\n {error}, reading the csv files instead')
+
+    return (read_weekly_prices_file(static_paths[0]),
+            NTC_preparation(read_NTC_file(static_paths[1])),
+            pw_preparation(read_pw_file(static_paths[2])))
+
+
+def slice_capacity(NTC, pw, start, end):
+    """
+    This function extracts the NTC and power limit slots fully contained in a time window, so that the welfare
+    model of a day can run on its own copy of the capacity state
+
+    Args:
+        NTC: prepared NTC dataframe (Pandas DataFrame)
+        pw: prepared power limit dataframe (Pandas DataFrame)
+        start: start of the time window (pd.Timestamp)
+        end: end of the time window (pd.Timestamp)
+    Return:
+        NTC_window: NTC slots of the window with a fresh range index (Pandas DataFrame)
+        pw_window: power limit slots of the window with a fresh range index (Pandas DataFrame)
+        index_NTC: positions of the window slots in NTC (numpy array)
+        index_pw: positions of the window slots in pw (numpy array)
+
+    """
+
+    index_NTC = np.flatnonzero(
+        (NTC['start_time'] >= start) & (NTC['end_time'] <= end))
+    index_pw = np.flatnonzero(
+        (pw['start_time'] >= start) & (pw['end_time'] <= end))
+
+    # optimize_selling and optimize_pumping address the slots by position, hence the range index
+    NTC_window = NTC.iloc[index_NTC].reset_index(drop=True)
+    pw_window = pw.iloc[index_pw].reset_index(drop=True)
+
+    return NTC_window, pw_window, index_NTC, index_pw
+
+
+def restore_capacity(NTC, pw, NTC_window, pw_window, index_NTC, index_pw):
+    """
+    This function writes the updated capacity of a window obtained with slice_capacity back into NTC and pw
+
+    Args:
+        NTC: prepared NTC dataframe updated in place (Pandas DataFrame)
+        pw: prepared power limit dataframe updated in place (Pandas DataFrame)
+        NTC_window: updated NTC slots of the window (Pandas DataFrame)
+        pw_window: updated power limit slots of the window (Pandas DataFrame)
+        index_NTC: positions of the window slots in NTC (numpy array)
+        index_pw: positions of the window slots in pw (numpy array)
+
+    """
+
+    for col in ['CH to DE_Actual value (MW) update', 'DE to CH_Actual value (MW) update']:
+        NTC.iloc[index_NTC, NTC.columns.get_loc(col)] = NTC_window[col].values
+
+    for col in ['Selling Actual value update [MW]', 'Pumping Actual value update [MW]']:
+        pw.iloc[index_pw, pw.columns.get_loc(col)] = pw_window[col].values
+
+
+class CapacityLedger:
+    """
+    Array-backed view of the NTC and power limit capacity used by the welfare model. The rows of both
+    dataframes are stored in contiguous NumPy arrays sorted by 15-minute slot number, so that the rows
+    of a contract are found arithmetically from its delivery start and decremented in place
+
+    Args:
+        NTC: prepared NTC dataframe (Pandas DataFrame)
+        pw: prepared power limit dataframe (Pandas DataFrame)
+
+    """
+
+    slot_duration = pd.Timedelta(15, unit='min')
+
+    multiplier_instr_type = {'Hour': 1, 'Half Hour': 2, 'Quarter Hour': 4}
+
+    # capacity columns of NTC and power limit used by each side of the welfare model
+    columns = {'selling': ('CH to DE_Actual value (MW) update', 'Selling Actual value update [MW]'),
+               'pumping': ('DE to CH_Actual value (MW) update', 'Pumping Actual value update [MW]')}
+
+    def __init__(self, NTC, pw):
+
+        self.NTC_grid = self.build_grid(NTC)
+        self.pw_grid = self.build_grid(pw)
+
+        order_NTC = self.NTC_grid['order']
+        order_pw = self.pw_grid['order']
+        self.values = {}
+        for side, (col_NTC, col_pw) in self.columns.items():
+            self.values[col_NTC] = NTC[col_NTC].to_numpy(dtype=float)[
+                order_NTC]
+            self.values[col_pw] = pw[col_pw].to_numpy(dtype=float)[order_pw]
+
+    def build_grid(self, df):
+        """
+        This function sorts the rows of a capacity dataframe by slot number
+
+        Args:
+            df: capacity dataframe with 'start_time' and 'end_time' columns (Pandas DataFrame)
+        Return:
+            grid: origin of the slots, row order sorted by slot and first sorted row of each slot (dict)
+
+        """
+
+        slot = self.slot_duration.value
+        start = df['start_time'].values.astype(np.int64)
+        end = df['end_time'].values.astype(np.int64)
+
+        origin = start.min()
+        if np.any((start-origin) % slot != 0) or np.any(end-start != slot):
+            raise ValueError(
+                'The capacity dataframe is not made of 15 minutes slots')
+
+        slot_number = (start-origin)//slot
+        order = np.argsort(slot_number, kind='stable')
+        counts = np.bincount(slot_number)
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+
+        return {'origin': origin, 'order': order, 'indptr': indptr}
+
+    def rows(self, grid, time, duration):
+        """
+        This function returns the range of sorted rows whose slot lies entirely within the delivery of a contract
+
+        Args:
+            grid: slot grid of NTC or power limit (dict)
+            time: delivery start in nanoseconds since epoch, scalar or one per contract (int or numpy array)
+            duration: delivery duration in nanoseconds, scalar or one per contract (int or numpy array)
+        Return:
+            start: first sorted row of the contract (int or numpy array)
+            end: sorted row after the last one of the contract (int or numpy array)
+
+        """
+
+        slot = self.slot_duration.value
+        n_slots = len(grid['indptr'])-1
+
+        # first slot starting after the delivery start and last slot ending before the delivery end
+        first = np.clip(-((grid['origin']-time)//slot), 0, n_slots)
+        last = np.clip((time+duration-grid['origin'])//slot, 0, n_slots)
+        last = np.maximum(first, last)
+
+        return grid['indptr'][first], grid['indptr'][last]
+
+    def contract_rows(self, delivery_start, instrument_type):
+        """
+        This function returns the sorted rows of NTC and power limit of many contracts at once
+
+        Args:
+            delivery_start: delivery start of each contract (Pandas Series)
+            instrument_type: instrument type of each contract (Pandas Series)
+        Return:
+            start_NTC, end_NTC, start_pw, end_pw: range of sorted rows of each contract (numpy arrays)
+
+        """
+
+        time = delivery_start.values.astype(np.int64)
+        duration = pd.Timedelta(60, unit='min').value // \
+            instrument_type.map(self.multiplier_instr_type).values.astype(np.int64)
+
+        start_NTC, end_NTC = self.rows(self.NTC_grid, time, duration)
+        start_pw, end_pw = self.rows(self.pw_grid, time, duration)
+
+        return start_NTC, end_NTC, start_pw, end_pw
+
+    def optimize(self, side, ex_vol, time, instru_type, p_match):
+        """
+        This function is the array-backed version of optimize_selling and optimize_pumping
+
+        Args:
+            side: 'selling' or 'pumping' (string)
+            ex_vol: executed volume of the contract (float)
+            time: delivery start of the contract (pd.Timestamp)
+            instru_type: instrument type of the contract (string)
+            p_match: whether the contract is matchable according to the hydro marginal price (bool)
+        Return:
+            binary outcome: 0 not matchable, 1 matched, 2 NTC binding, 3 power binding, 4 both binding (int)
+
+        """
+
+        if not p_match:
+            return 0
+
+        col_NTC, col_pw = self.columns[side]
+        multiplier = self.multiplier_instr_type[instru_type]
+        duration = pd.Timedelta(60/multiplier, unit='min')
+
+        start_NTC, end_NTC = self.rows(
+            self.NTC_grid, time.value, duration.value)
+        start_pw, end_pw = self.rows(self.pw_grid, time.value, duration.value)
+
+        values_NTC = self.values[col_NTC][start_NTC:end_NTC]
+        values_pw = self.values[col_pw][start_pw:end_pw]
+
+        diff_NTC = values_NTC - ex_vol*multiplier
+        diff_pw = values_pw - ex_vol*multiplier
+
+        # same binding conditions of optimize_selling and optimize_pumping
+        if np.all(diff_NTC >= 0) and np.all(diff_pw >= 0):
+            values_NTC[:] = diff_NTC
+            values_pw[:] = diff_pw
+            return 1
+
+        elif np.all(diff_NTC < 0) and np.all(diff_pw >= 0):
+            values_NTC[:] = 0
+            values_pw[:] = diff_pw
+            return 2
+
+        elif np.all(diff_NTC >= 0) and np.all(diff_pw < 0):
+            values_NTC[:] = diff_NTC
+            values_pw[:] = 0
+            return 3
+
+        else:
+            values_NTC[:] = 0
+            values_pw[:] = 0
+            return 4
+
+    def update_frames(self, NTC, pw):
+        """
+        This function writes the capacity left in the ledger into the update columns of NTC and pw
+
+        Args:
+            NTC: prepared NTC dataframe updated in place (Pandas DataFrame)
+            pw: prepared power limit dataframe updated in place (Pandas DataFrame)
+
+        """
+
+        for col_NTC, col_pw in self.columns.values():
+            NTC.iloc[self.NTC_grid['order'], NTC.columns.get_loc(
+                col_NTC)] = self.values[col_NTC]
+            pw.iloc[self.pw_grid['order'], pw.columns.get_loc(
+                col_pw)] = self.values[col_pw]
+
+
 def optimize_selling(NTC, pw, ex_vol, time, instru_type, p_match):
 
     # check in the first place whether the contract was matchable according to marginal price of hydro considerations
@@ -265,44 +767,144 @@ def update_execution_price(binary_outcome_s, binary_outcome_p, marginal_price_s,
         return execution_price
 
 
-def match_transactions_both_sides(pivoted_levels, NTC, wp, power_lim):
+class WeeklyPrices:
+    """
+    Sorted interval index of the weekly hydro prices. Every week covers the dates after its start date up to
+    its end date included, so that the week of each date is found by a binary search on the end dates
+
+    Args:
+        wp: weekly prices with 'start_date' and 'End Date' columns, as read by read_weekly_prices_file (Pandas DataFrame)
+
+    """
+
+    def __init__(self, wp):
+
+        wp_sorted = wp.sort_values('End Date')
+
+        self.start = wp_sorted['start_date'].values
+        self.end = wp_sorted['End Date'].values
+        self.price = wp_sorted['Average Weekly Price [Euro/MWh]'].to_numpy(
+            dtype=float)
+
+    def lookup(self, dates):
+        """
+        This function returns the average weekly price of the week of every date
+
+        Args:
+            dates: dates to price (Pandas Series)
+        Return:
+            price: average weekly price of each date (NumPy array)
+
+        """
+
+        dates = dates.values
+        week = np.searchsorted(self.end, dates, side='left')
+
+        # dates after the last week or before the start of their week are not covered by the prices
+        covered = week < len(self.end)
+        covered[covered] = self.start[week[covered]] < dates[covered]
+        if not covered.all():
+            raise ValueError(
+                f'No weekly price covers the dates {pd.unique(dates[~covered])}')
+
+        return self.price[week]
+
+
+def match_transactions_both_sides(pivoted_levels, NTC, wp, power_lim, ledger=None, kernel=False, pumping_threshold=0.7):
+    """
+    This function matches the transactions of a day with the Swiss hydro flexibility, pumping the cheapest
+    and selling the most expensive transactions within the NTC and power limit capacity
+
+    Args:
+        pivoted_levels: transactions of the day (Pandas DataFrame)
+        NTC: prepared NTC dataframe (Pandas DataFrame)
+        wp: weekly prices, or their WeeklyPrices index built once per run (Pandas DataFrame or WeeklyPrices)
+        power_lim: prepared power limit dataframe (Pandas DataFrame)
+        ledger: array-backed capacity state, None to update the dataframes row by row (CapacityLedger)
+        kernel: deciding whether to run the greedy allocation on arrays (bool)
+        pumping_threshold: share of the weekly price below which contracts can be matched for pumping (float)
+    Return:
+        pivoted_levels_sort: transactions with the weekly prices and the outcome of the matching (Pandas DataFrame)
+
+    """
 
     # sort the pivoted df in ascending way - useful to match pumping
     pivoted_levels_sort = pivoted_levels.sort_values(
         by=['Execution Price'], ascending=True)
 
-    # this is the first date of the day, it is then used to find the week for the price
-    # change pumping_threshold value to set the percentage of marginal cost for pumping
+    # the end validity date of every transaction is used to find the week for the price
+    # pumping_threshold sets the percentage of marginal cost for pumping
+    weekly_prices = wp if isinstance(wp, WeeklyPrices) else WeeklyPrices(wp)
+    weekly_price = weekly_prices.lookup(
+        pivoted_levels_sort['End Validity Date'])
 
-    pumping_threshold = 0.7
-    date = pivoted_levels['End Validity Date'].iloc[0]
-    weekly_price = [wp['Average Weekly Price [Euro/MWh]'][(wp['start_date'] < date) &
-                                                          (wp['End Date'] >= date)].item(), pumping_threshold*wp['Average Weekly Price [Euro/MWh]'][(wp['start_date'] < date) &
-                                                                                                                                                    (wp['End Date'] >= date)].item()]
     # do not account for contracts lower than weekly price for selling
     # do not account for contracts higher than pumping price for pumping
-    pivoted_levels_sort['weekly_hydro_marginal_price_selling'] = weekly_price[0]
-    pivoted_levels_sort['weekly_hydro_marginal_price_pumping'] = weekly_price[1]
-
-    pivoted_levels_sort['possible_match_selling'] = pivoted_levels_sort['Execution Price'] >= weekly_price[0]
-    pivoted_levels_sort['possible_match_pumping'] = pivoted_levels_sort['Execution Price'] <= weekly_price[1]
+    pivoted_levels_sort['weekly_hydro_marginal_price_selling'] = weekly_price
+    pivoted_levels_sort['weekly_hydro_marginal_price_pumping'] = pumping_threshold * \
+        weekly_price
+
+    pivoted_levels_sort['possible_match_selling'] = pivoted_levels_sort['Execution Price'] >= pivoted_levels_sort['weekly_hydro_marginal_price_selling']
+    pivoted_levels_sort['possible_match_pumping'] = pivoted_levels_sort['Execution Price'] <= pivoted_levels_sort['weekly_hydro_marginal_price_pumping']
+
+    if ledger is not None and kernel:
+
+        # the greedy allocation of both sides runs on arrays, the selling order being the descending
+        # sort of the pumping order as in the row by row path
+        order_selling = pivoted_levels_sort['Execution Price'].reset_index(
+            drop=True).sort_values(ascending=False).index.values
+
+        outcome_pumping, outcome_selling, a_posteriori_price = greedy_matching(ledger,
+                                                                               pivoted_levels_sort['Executed Volume'].values,
+                                                                               pivoted_levels_sort['Instrument Type'].map(
+                                                                                   ledger.multiplier_instr_type).values,
+                                                                               pivoted_levels_sort['Delivery Start'],
+                                                                               pivoted_levels_sort['Instrument Type'],
+                                                                               pivoted_levels_sort['possible_match_pumping'].values,
+                                                                               pivoted_levels_sort['possible_match_selling'].values,
+                                                                               order_selling,
+                                                                               pivoted_levels_sort['Execution Price'].values,
+                                                                               pivoted_levels_sort['weekly_hydro_marginal_price_selling'].values,
+                                                                               pivoted_levels_sort['weekly_hydro_marginal_price_pumping'].values)
+
+        pivoted_levels_sort['match_binary_outcome_pumping'] = outcome_pumping
+        pivoted_levels_sort = pivoted_levels_sort.iloc[order_selling]
+        pivoted_levels_sort['match_binary_outcome_selling'] = outcome_selling[order_selling]
+        pivoted_levels_sort['A posteriori Execution Price'] = a_posteriori_price[order_selling]
+
+        # eventually sort the table in time order
+        pivoted_levels_sort.sort_values(by='End Validity Date', inplace=True)
+
+        return pivoted_levels_sort
 
     # match between possible contracts, NTC and power capacity for pumping
-    pivoted_levels_sort['match_binary_outcome_pumping'] = pivoted_levels_sort.apply(lambda x: optimize_pumping(NTC, power_lim,
-                                                                                                               x['Executed Volume'],
-                                                                                                               x['Delivery Start'],
-                                                                                                               x['Instrument Type'],
-                                                                                                               x['possible_match_pumping']), axis=1)
+    if ledger is not None:
+        pivoted_levels_sort['match_binary_outcome_pumping'] = [ledger.optimize('pumping', *x) for x in zip(pivoted_levels_sort['Executed Volume'],
+                                                                                                             pivoted_levels_sort['Delivery Start'],
+                                                                                                             pivoted_levels_sort['Instrument Type'],
+                                                                                                             pivoted_levels_sort['possible_match_pumping'])]
+    else:
+        pivoted_levels_sort['match_binary_outcome_pumping'] = pivoted_levels_sort.apply(lambda x: optimize_pumping(NTC, power_lim,
+                                                                                                                   x['Executed Volume'],
+                                                                                                                   x['Delivery Start'],
+                                                                                                                   x['Instrument Type'],
+                                                                                                                   x['possible_match_pumping']), axis=1)
 
     # sort the df in a descending way - useful to match selling
     pivoted_levels_sort = pivoted_levels_sort.sort_values(
         by=['Execution Price'], ascending=False)
 
-    pivoted_levels_sort['match_binary_outcome_selling'] = pivoted_levels_sort.apply(lambda x: optimize_selling(NTC, power_lim,
-                                                                                                               x['Executed Volume'],
-                                                                                                               x['Delivery Start'],
-                                                                                                               x['Instrument Type'],
-                                                                                                               x['possible_match_selling']), axis=1)
+    if ledger is not None:
+        pivoted_levels_sort['match_binary_outcome_selling'] = [ledger.optimize('selling', *x) for x in zip(pivoted_levels_sort['Executed Volume'],
+                                                                                                             pivoted_levels_sort['Delivery Start'],
+                                                                                                             pivoted_levels_sort['Instrument Type'],
+                                                                                                             pivoted_levels_sort['possible_match_selling'])]
+    else:
+        pivoted_levels_sort['match_binary_outcome_selling'] = pivoted_levels_sort.apply(lambda x: optimize_selling(NTC, power_lim,
+                                                                                                                   x['Executed Volume'],
+                                                                                                                   x['Delivery Start'],
+                                                                                                                   x['Instrument Type'],
+                                                                                                                   x['possible_match_selling']), axis=1)
 
     # add column with updated execution price N.B. marginal
     pivoted_levels_sort['A posteriori Execution Price'] = pivoted_levels_sort.apply(